@@ -79,7 +79,13 @@ class AudioInterface(ABC, metaclass=SingletonABCMeta):
         pass
 
     @abstractmethod
-    def play_audio(self, sample_rate: int, audio_buffer: np.ndarray) -> None:
+    def play_audio(self, sample_rate: int, audio_buffer: np.ndarray, append_silence: bool = True) -> None:
+        """
+        Queue audio for playback.
+
+        :param append_silence: If False the next queued buffer follows without a pause,
+                               used to play a stream chunk by chunk.
+        """
         pass
 
     @abstractmethod
@@ -51,7 +51,7 @@ class SoundCard(AudioInterface):
         self.frames_per_buffer: int = 1024
         self.bytes_per_frame: int = 2
 
-        self.playback_queue: "queue.Queue[Tuple[int, np.ndarray]]" = queue.Queue()
+        self.playback_queue: "queue.Queue[Tuple[int, np.ndarray, bool]]" = queue.Queue()
         self.record_queue: "queue.Queue[bytes]" = queue.Queue()
         self.recording_active = threading.Event()
 
@@ -60,6 +60,7 @@ class SoundCard(AudioInterface):
 
         self.current_buffer: bytes = b""
         self.current_pos: int = 0
+        self.current_append_silence: bool = True
         self.leftover_silence_frames: int = 0
 
         self.playback_stream = self.audio.open(
@@ -121,14 +122,15 @@ class SoundCard(AudioInterface):
                 )
                 self.current_pos += bytes_to_copy
                 if self.current_pos >= len(self.current_buffer):
-                    self.leftover_silence_frames = self.sample_rate
+                    # chunks of a stream are played back to back without the trailing pause
+                    self.leftover_silence_frames = self.sample_rate if self.current_append_silence else 0
                     self.current_buffer = b""
                     self.current_pos = 0
                 if len(output_data) >= output_bytes_needed:
                     break
             else:
                 if not self.playback_queue.empty():
-                    sr, audio_array = self.playback_queue.get_nowait()
+                    sr, audio_array, self.current_append_silence = self.playback_queue.get_nowait()
                     self.current_buffer = self._prepare_audio_for_playback(
                         audio_array,
                         in_sample_rate=sr,
@@ -190,7 +192,7 @@ class SoundCard(AudioInterface):
             self.record_queue.get()
         self.logger.debug("Recording stopped and stream closed.")
 
-    def play_audio(self, sample_rate: int, audio_data: Any) -> None:
+    def play_audio(self, sample_rate: int, audio_data: Any, append_silence: bool = True) -> None:
         if not isinstance(audio_data, np.ndarray):
             if isinstance(audio_data, bytes):
                 audio_data = BytesIO(audio_data)
@@ -212,7 +214,7 @@ class SoundCard(AudioInterface):
         if self.stop_signal_playback.is_set():
             self.logger.debug("soundcard_pyaudio.play_audio:Unblock playback with play_audio function")
             self.stop_signal_playback.clear()
-        self.playback_queue.put((sample_rate, audio_data))
+        self.playback_queue.put((sample_rate, audio_data, append_silence))
 
     def stop_playback(self) -> None:
         self.stop_signal_playback.set()
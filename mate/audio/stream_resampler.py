@@ -0,0 +1,51 @@
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin, lfilter
+
+
+class StreamResampler:
+    """
+    Polyphase resampler for audio that arrives in chunks. The filter state and the
+    sample phase are carried from one chunk to the next, so the output of chunked
+    input is the same as resampling the whole signal at once, without steps at the
+    chunk boundaries.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int) -> None:
+        divisor = gcd(in_rate, out_rate)
+        self.up: int = out_rate // divisor
+        self.down: int = in_rate // divisor
+        # same anti-aliasing filter as scipy.signal.resample_poly uses by default, none for equal rates
+        max_rate = max(self.up, self.down)
+        if max_rate > 1:
+            half_len = 10 * max_rate
+            self._taps: np.ndarray = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * self.up
+        else:
+            self._taps = np.ones(1)
+        self._zi: np.ndarray = np.zeros(len(self._taps) - 1)
+        # index of the next output sample in the upsampled signal of the next chunk
+        self._phase: int = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample one chunk of mono samples, returns float64 samples at the output rate.
+        """
+        if self.up == self.down:
+            return np.asarray(samples, dtype=np.float64)
+        upsampled = np.zeros(len(samples) * self.up)
+        upsampled[::self.up] = samples
+        filtered, self._zi = lfilter(self._taps, 1.0, upsampled, zi=self._zi)
+        out = filtered[self._phase::self.down]
+        self._phase = (self._phase - len(filtered)) % self.down
+        return out
+
+    def flush(self) -> np.ndarray:
+        """
+        Output the samples still held in the filter at the end of the stream.
+        """
+        if self.up == self.down:
+            return np.zeros(0)
+        # the filter delays the signal by half its length
+        pad = -(-(len(self._taps) // 2) // self.up)
+        return self.process(np.zeros(pad))
@@ -2,13 +2,14 @@ import random
 import threading
 import time
 import os
-import io
 import hashlib
 import logging
 import asyncio
+from math import gcd
 from pydub import AudioSegment
-from typing import AsyncGenerator, Tuple, Any
-import soundfile as sf
+from typing import AsyncGenerator, Tuple, Any, List, Dict, Optional
+import numpy as np
+from scipy.signal import resample_poly
 from tqdm import tqdm
 
 from mate.audio.soundcard_pyaudio import SoundCard
@@ -19,22 +20,52 @@ from mate.voice_activated_recording.va_picovoice import PorcupineWakeWord
 from mate.services import ServiceDiscovery
 
 
+_HI_CHOICES: Tuple[str, ...] = (
+    "ja, hi", "schiess los!", "was gibts?", "hi, was geht?", "leg los!",
+    "was willst du?", "sprechen Sie", "jo bro", "hey ho bro", "was geht so?"
+)
+_BYE_CHOICES: Tuple[str, ...] = (
+    "Auf Wiedersehen!", "Mach’s gut!", "Bis zum nächsten Mal!", "Schönen Tag noch!",
+    "Bis bald!", "Pass auf dich auf!", "Bleib gesund!", "Man sieht sich!", "Bis später!", "Bis dann!",
+    "Gute Reise!", "Viel Erfolg noch!", "Danke und tschüss!", "Alles Gute!",
+    "Bis zum nächsten Treffen!", "Leb wohl!"
+)
+_INIT_GREETINGS: Tuple[str, ...] = (
+    "Guten Tag!", "Hi, wie geht's?", "Schön dich zu sehen!", "Hallo und willkommen!",
+    "Freut mich, dich zu treffen!", "Hallo zusammen!", "Hallo, mein Freund!",
+    "Guten Tag, wie kann ich helfen?", "Willkommen!", "Hallo an alle!",
+    "Herzlich willkommen!", "Hallo, schön dich hier zu haben!", "Hey, alles klar?",
+    "Hallo, schön dich kennenzulernen!", "Hallo, wie läuft's?", "Einen schönen Tag!"
+)
+
+# numpy dtype of the pcm samples in AudioSegment.raw_data, keyed by sample width in bytes
+_PCM_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# decoded phrases are stored in the user's cache directory, the install itself may be read-only
+_PCM_CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "steamdeck-mate")
+
+
 class HumanSpeechAgent:
-    _instance = None
+    _instance: Optional["HumanSpeechAgent"] = None
     _lock = threading.Lock()
 
-    def __new__(cls, *args, **kwargs):
+    @classmethod
+    def instance(cls, service_discovery: ServiceDiscovery) -> "HumanSpeechAgent":
+        """
+        Return the shared agent, creating it on the first call. Only the first
+        call takes the lock, later calls just return the existing instance.
+        """
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = super(HumanSpeechAgent, cls).__new__(cls)
+                    cls._instance = cls(service_discovery=service_discovery)
         return cls._instance
 
     def __init__(self, service_discovery: ServiceDiscovery) -> None:
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         if getattr(self, "_initialized", False):
             return
         self._initialized = True
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
         self.interrupt_speech_thread: threading.Thread = None
         self.soundcard: SoundCard = SoundCard()
@@ -45,29 +76,21 @@ class HumanSpeechAgent:
         self.stop_signal: threading.Event = threading.Event()
 
         self.abort_speech_choices = ["Anwort abgebrochen, was soll ich tun?"]
-        self.hi_choices = [
-            "ja, hi", "schiess los!", "was gibts?", "hi, was geht?", "leg los!",
-            "was willst du?", "sprechen Sie", "jo bro", "hey ho bro", "was geht so?"
-        ]
-        self.bye_choices = [
-            "Auf Wiedersehen!", "Mach’s gut!", "Bis zum nächsten Mal!", "Schönen Tag noch!",
-            "Bis bald!", "Pass auf dich auf!", "Bleib gesund!", "Man sieht sich!", "Bis später!", "Bis dann!",
-            "Gute Reise!", "Viel Erfolg noch!", "Danke und tschüss!", "Alles Gute!",
-            "Bis zum nächsten Treffen!", "Leb wohl!"
-        ]
+        self.hi_choices: Tuple[str, ...] = _HI_CHOICES
+        self.bye_choices: Tuple[str, ...] = _BYE_CHOICES
         init_greetings_identity = ""
-        self.init_greetings = [
-            "Guten Tag!", "Hi, wie geht's?", "Schön dich zu sehen!", "Hallo und willkommen!",
-            "Freut mich, dich zu treffen!", "Hallo zusammen!", "Hallo, mein Freund!",
-            "Guten Tag, wie kann ich helfen?", "Willkommen!", "Hallo an alle!",
-            "Herzlich willkommen!", "Hallo, schön dich hier zu haben!", "Hey, alles klar?",
-            "Hallo, schön dich kennenzulernen!", "Hallo, wie läuft's?", "Einen schönen Tag!"
+        self.init_greetings: List[str] = [
+            f"{init_greetings_identity} {g}".strip() for g in _INIT_GREETINGS
         ]
-        self.init_greetings = list(map(lambda g: f"{init_greetings_identity} {g}", self.init_greetings))
         self.did_not_understand = [
             "Das war unverständlich, bitte wiederholen"
         ]
         self.explain_sentence = "Sag das wort computer um zu starten."
+        # decoded audio of the mp3 files, keyed by file path
+        self._pcm_cache: Dict[str, Tuple[int, np.ndarray]] = {}
+        # one lock per mp3 path, so a file is decoded once even if the warmup and a greeting ask for it at the same time
+        self._decode_locks: Dict[str, threading.Lock] = {}
+        self._decode_locks_guard = threading.Lock()
 
     async def __aenter__(self):
         self.logger.info("Enter constructing class")
@@ -164,9 +187,6 @@ class HumanSpeechAgent:
     async def wait_until_talking_finished(self) -> None:
         self.logger.debug("block_until_talking_finished: blocking")
         tts_provider: TTSInterface = await self.service_discovery.get_best_service("TTS")
-        #c = 0
-        #while c < 2:
-        #    c += 1
         await asyncio.to_thread(tts_provider.wait_until_done)
         await asyncio.to_thread(tts_provider.soundcard.wait_until_playback_finished)
         self.logger.debug("block_until_talking_finished: unblocking")
@@ -209,15 +229,17 @@ class HumanSpeechAgent:
         self.logger.info("Warmup TTS cache")
         os.makedirs("tts_cache", exist_ok=True)
         all_choices = (
-            self.hi_choices
-            + self.bye_choices
+            list(self.hi_choices)
+            + list(self.bye_choices)
             + self.init_greetings
             + [self.explain_sentence]
             + self.did_not_understand
             + self.abort_speech_choices
         )
+        paths: List[str] = []
         for sentence in tqdm(all_choices, desc="Warmup cache with hi and bye phrases"):
             file_name = await self._get_cache_file_name(sentence)
+            paths.append(file_name)
             if not os.path.exists(file_name):
                 tts_provider: TTSInterface = await self.service_discovery.get_best_service("TTS")
                 print(type(tts_provider))
@@ -226,6 +248,9 @@ class HumanSpeechAgent:
                     tts_provider.render_sentence,
                     sentence=sentence, store_file_name=file_name, output_format="mp3"
                 )
+        # decode all phrases in parallel, the mp3 decoding releases the GIL
+        await asyncio.gather(*[asyncio.to_thread(self._decode_and_store, p) for p in dict.fromkeys(paths)])
+        self.logger.info("Decoded %d cached phrases", len(self._pcm_cache))
 
     async def _get_cache_file_name(self, sentence: str) -> str:
         hash_obj = hashlib.md5(sentence.encode("utf-8"))
@@ -233,12 +258,67 @@ class HumanSpeechAgent:
         return os.path.join("tts_cache/", f"{hash_str}.mp3")
 
     async def _load_mp3_to_wav_bytesio(self, mp3_path: str) -> Tuple[int, Any]:
+        cached = self._pcm_cache.get(mp3_path)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self._decode_and_store, mp3_path)
+
+    def _decode_and_store(self, mp3_path: str) -> Tuple[int, Any]:
+        with self._decode_locks_guard:
+            lock = self._decode_locks.setdefault(mp3_path, threading.Lock())
+        with lock:
+            cached = self._pcm_cache.get(mp3_path)
+            if cached is not None:
+                return cached
+            device_rate = self.soundcard.sample_rate
+            # raw float32 samples at the soundcard rate, named after the mp3 path and rebuilt when the mp3 is newer
+            npy_name = hashlib.md5(os.path.abspath(mp3_path).encode("utf-8")).hexdigest()
+            npy_path = os.path.join(_PCM_CACHE_DIR, f"{npy_name}_{device_rate}.npy")
+            data = None
+            if os.path.exists(npy_path) and os.path.getmtime(npy_path) >= os.path.getmtime(mp3_path):
+                try:
+                    data = np.load(npy_path, mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    self.logger.warning("Could not read %s, decoding %s again: %s", npy_path, mp3_path, e)
+            if data is None:
+                data = self._decode_resampled(mp3_path, device_rate)
+                self._write_npy(npy_path, data)
+            self._pcm_cache[mp3_path] = (device_rate, data)
+            return device_rate, data
+
+    def _decode_resampled(self, mp3_path: str, device_rate: int) -> np.ndarray:
+        sample_rate, data = self._decode_mp3(mp3_path)
+        # resample once here, so the soundcard does not need to do it on every playback
+        if sample_rate != device_rate:
+            divisor = gcd(device_rate, sample_rate)
+            data = resample_poly(data, device_rate // divisor, sample_rate // divisor, axis=0)
+        return data.astype(np.float32)
+
+    def _write_npy(self, npy_path: str, data: np.ndarray) -> None:
+        # write to a temporary file and rename it, so a reader never sees a partly written file
+        tmp_path = f"{npy_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(_PCM_CACHE_DIR, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp_path, npy_path)
+        except OSError as e:
+            self.logger.warning("Could not write %s: %s", npy_path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _decode_mp3(mp3_path: str) -> Tuple[int, Any]:
         audio_segment = AudioSegment.from_mp3(mp3_path)
-        wav_bytes = io.BytesIO()
-        audio_segment.export(wav_bytes, format="wav")
-        wav_bytes.seek(0)
-        data, sample_rate = sf.read(wav_bytes, dtype="float32")
-        return sample_rate, data
+        # raw_data is interleaved PCM already, no need for a wav round trip
+        sample_width = audio_segment.sample_width
+        raw = np.frombuffer(audio_segment.raw_data, dtype=_PCM_DTYPES[sample_width])
+        data = raw.astype(np.float32) / float(2 ** (8 * sample_width - 1))
+        if audio_segment.channels > 1:
+            data = data.reshape(-1, audio_segment.channels)
+        return audio_segment.frame_rate, data
 
     async def start_speech_interrupt_thread(self, ext_stop_signal: threading.Event) -> None:
         def stop_speech() -> None:
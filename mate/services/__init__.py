@@ -1,9 +1,25 @@
 import abc
+import logging
 import sys
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import aiohttp
+from typing import Dict, Tuple, Optional, Type
 
 from mate.services.llm.prompt_manager_interface import PromptManager
 
 
+@lru_cache(maxsize=128)
+def _parse_endpoint(endpoint: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """
+    Split an endpoint URL into scheme, host and port. Endpoints are fixed strings,
+    so each one is parsed only once.
+    """
+    parsed = urlparse(endpoint)
+    return parsed.scheme, parsed.hostname, parsed.port
+
+
 class BaseService(abc.ABC):
     """
     Abstract interface for all services.
@@ -13,25 +29,67 @@ class BaseService(abc.ABC):
       - An async check_availability() method
     """
 
-    def __init__(self, name: str, service_type: str, priority: int) -> None:
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+    # the attribute sets of the services are fixed, subclasses list theirs in __slots__ as well
+    __slots__ = ("name", "priority")
+
+    # keep-alive HTTP sessions used for availability probes, shared by all services per (host, port)
+    _probe_sessions: Dict[Tuple[str, int], aiohttp.ClientSession] = {}
+
+    # every subclass of BaseService, keyed by its dotted import path
+    _registry: Dict[str, Type["BaseService"]] = {}
+
+    logger: logging.Logger
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        BaseService._registry[f"{cls.__module__}.{cls.__qualname__}"] = cls
+        # one logger per class, instances only read it
+        cls.logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
+
+    # set by the service interfaces, e.g. "LLM", "STT" or "TTS"
+    service_type: str = ""
+
+    def __init__(self, name: str, priority: int) -> None:
         self.name: str = name
-        self.service_type: str = service_type
         self.priority: int = priority
 
+    @classmethod
+    def config_endpoint(cls) -> Optional[str]:
+        """
+        Endpoint whose reachability is all there is to the availability of this class,
+        or None if the availability can only be checked by an instance.
+        """
+        return None
+
+    @classmethod
+    async def probe_class(cls) -> Optional[bool]:
+        """
+        Check the availability without creating an instance. Returns None if the class
+        has no config_endpoint() and needs an instance for check_availability().
+        """
+        endpoint = cls.config_endpoint()
+        if endpoint is None:
+            return None
+        return await cls._check_endpoint(endpoint)
+
     async def __check_remote_endpoint__(self, endpoint: str) -> bool:
-        parsed = urlparse(endpoint)
-        host: Optional[str] = parsed.hostname
-        port: Optional[int] = parsed.port
+        return await self._check_endpoint(endpoint)
+
+    @classmethod
+    async def _check_endpoint(cls, endpoint: str) -> bool:
+        scheme, host, port = _parse_endpoint(endpoint)
 
         if not host or not port:
-            self.logger.debug(
+            cls.logger.debug(
                 "[check_availability %s] Invalid endpoint: %s (missing host or port)",
-                self.name,
+                cls.__name__,
                 endpoint
             )
             return False
 
+        if scheme in ("http", "https"):
+            return await cls._check_http_endpoint(endpoint, host, port)
+
         # Try to open a connection with a 2-second timeout.
         try:
             reader, writer = await asyncio.wait_for(
@@ -41,9 +99,9 @@ class BaseService(abc.ABC):
             writer.close()
             await writer.wait_closed()
         except Exception as e:
-            #self.logger.debug(
+            #cls.logger.debug(
             #    "[check_availability %s] Could not connect to host '%s' on port %s. Reason: %s",
-            #    self.name,
+            #    cls.__name__,
             #    host,
             #    port,
             #    e
@@ -51,6 +109,41 @@ class BaseService(abc.ABC):
             return False
         return True
 
+    @staticmethod
+    async def _check_http_endpoint(endpoint: str, host: str, port: int) -> bool:
+        """
+        Probe an HTTP endpoint with a HEAD request over a kept-alive connection. Any
+        HTTP response, also an error status, means the server is up.
+        """
+        session = BaseService._probe_sessions.get((host, port))
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=1, keepalive_timeout=30)
+            )
+            BaseService._probe_sessions[(host, port)] = session
+        try:
+            async with session.head(endpoint, timeout=aiohttp.ClientTimeout(total=2)):
+                pass
+        except Exception:
+            return False
+        return True
+
+    @classmethod
+    async def close_probe_sessions(cls) -> None:
+        """
+        Close the shared HTTP sessions used by the availability probes.
+        """
+        sessions = list(BaseService._probe_sessions.values())
+        BaseService._probe_sessions.clear()
+        for session in sessions:
+            await session.close()
+
+    async def close(self) -> None:
+        """
+        Release network resources held by the service. Called on shutdown.
+        """
+        pass
+
     @abc.abstractmethod
     async def check_availability(self) -> bool:
         pass
@@ -61,43 +154,52 @@ class BaseService(abc.ABC):
 
 
 import asyncio
-import threading
+import os
 import logging
+import time
+from collections import defaultdict
 from typing import Optional, List, Tuple, Type, Dict, Any
-from urllib.parse import urlparse
 
 # Assuming BaseService is defined elsewhere.
 # from your_module import BaseService
 
+class _ServiceRecord:
+    """
+    State of one service in ServiceDiscovery. Records are never changed after
+    creation, updates replace the record, so a copied dict of records is a
+    consistent snapshot.
+    """
+    __slots__ = ("service_class", "type", "priority", "instance", "available")
+
+    def __init__(
+        self,
+        service_class: Type[BaseService],
+        priority: int,
+        instance: Optional[BaseService],
+        available: bool
+    ) -> None:
+        self.service_class: Type[BaseService] = service_class
+        self.type: str = service_class.service_type
+        self.priority: int = priority
+        # stays None until the service is first returned by get_best_service
+        self.instance: Optional[BaseService] = instance
+        self.available: bool = available
+
+
 class ServiceDiscovery:
     """
     Manages a set of services. Periodically checks each service's status
     (available/unavailable). Allows retrieval of the 'best' service for a
     given type, e.g., 'TTS', 'STT', or 'LLM'.
 
-    Now implemented as a thread-safe Singleton with double-checked locking.
+    The application shares one instance, use get_service_discovery() to get it.
     """
 
-    _instance: Optional["ServiceDiscovery"] = None
-    _instance_lock = threading.Lock()
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:  # Fast path without lock.
-            with cls._instance_lock:
-                if cls._instance is None:  # Double-check under lock.
-                    cls._instance = super().__new__(cls)
-        return cls._instance
-
     def __init__(
         self,
         service_definitions: Optional[List[BaseService]] = None
     ) -> None:
-        if getattr(self, "_initialized", False):
-            return
-        self._initialized = True
-
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self.logger.debug(f"Processing {len(service_definitions)} service definitions")
         self.service_definitions: List[Tuple[Type["BaseService"], str, int]] = []
         if service_definitions is None:
             self.logger.info("Got no service definitions to process from remote_services.yml")
@@ -108,12 +210,30 @@ class ServiceDiscovery:
                 #self.logger.debug("\n".join([f"{attr}: {getattr(obj, attr)}" for attr in dir(obj) if not attr.startswith('__')]))
                 self.service_definitions.append((obj, obj.config['name'], obj.config['priority']))
 
-        # Map of service name -> dict with "instance" and "available"
-        self.services: Dict[str, Dict[str, Any]] = {}
+        # Map of service name -> its current record.
+        self.services: Dict[str, _ServiceRecord] = {}
 
         # Lock for thread-safe access to self.services (used inside async tasks).
         self._services_lock = asyncio.Lock()
 
+        # Limits how many availability probes are open at the same time.
+        self._check_sem = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_CHECKS", "8")))
+
+        # Map of service name -> (monotonic timestamp, available) of the last successful probe.
+        self._avail_cache: Dict[str, Tuple[float, bool]] = {}
+        self._avail_ttl: float = 15.0
+        # Seconds a single availability check may take, a hanging service must not stall the scan.
+        self._check_timeout: float = 2.0
+
+        # Time of the last availability flip, the update loop polls faster after a change.
+        self._last_change_ts: float = time.monotonic()
+
+        # Map of service type -> name of the available service with the highest priority, rebuilt after every scan.
+        self._best_by_type: Dict[str, str] = {}
+
+        # Map of service type -> names of the services of that type.
+        self._by_type: Dict[str, List[str]] = defaultdict(list)
+
         # Background task reference for availability checks.
         self._update_task: Optional[asyncio.Task] = None
 
@@ -124,7 +244,7 @@ class ServiceDiscovery:
         """
         Start periodic service availability checks in the background.
         """
-        self.logger.info(f"Check availability of {len(self.service_definitions)} services in given interval every 3 seconds")
+        self.logger.info(f"Check availability of {len(self.service_definitions)} services every 3 to 30 seconds")
         self._stop_event.clear()
         # Run one full scan and wait for it to finish.
         await self._check_services_once()
@@ -143,15 +263,33 @@ class ServiceDiscovery:
             except asyncio.CancelledError:
                 pass
             self._update_task = None
+        for record in list(self.services.values()):
+            if record.instance is not None:
+                try:
+                    await record.instance.close()
+                except Exception as e:
+                    self.logger.warning("Error closing service %s: %s", record.instance.name, e)
+        await BaseService.close_probe_sessions()
 
     async def _update_loop(self) -> None:
         """
-        Background task that updates the availability of all services every 3 seconds.
+        Background task that updates the availability of all services. It checks every
+        3 seconds for 30 seconds after a service changed its availability, then backs
+        off up to every 30 seconds while nothing changes.
         """
+        attempts = 0
         while not self._stop_event.is_set():
             await self._check_services_once()
+            if time.monotonic() - self._last_change_ts < 30:
+                attempts = 0
+                interval = 3
+            else:
+                attempts += 1
+                interval = min(30, 3 * 2 ** attempts)
             try:
-                await asyncio.sleep(3)
+                await asyncio.wait_for(self._stop_event.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
             except asyncio.CancelledError:
                 break
 
@@ -160,58 +298,171 @@ class ServiceDiscovery:
         Run one iteration of checks across all known service definitions in parallel.
         """
         self.logger.debug(f"Running availablilty check of {len(self.services)} services")
-        async def check_one(service_class: Type["BaseService"], name: str, priority: int):
-            # If an instance already exists, reuse it; otherwise, create a new one.
-            async with self._services_lock:
-                existing = self.services.get(name)
-            if existing is not None:
-                instance = existing.get("instance")
-            else:
-                instance = None
-
-            if instance is None:
-                try:
-                    instance = service_class()
-                except Exception as e:
-                    self.logger.exception("Error creating service %s: %s", name, e)
-                    return (name, None, False)
+        # Services on the same host and port share one probe per scan.
+        endpoint_probes: Dict[Tuple[Optional[str], Optional[int]], asyncio.Task] = {}
+
+        async def probe_class(service_class: Type["BaseService"]) -> Optional[bool]:
+            async with self._check_sem:
+                return await service_class.probe_class()
+
+        async def probe(service_class: Type["BaseService"]) -> Optional[bool]:
+            endpoint = service_class.config_endpoint()
+            if endpoint is None:
+                return None
+            _, host, port = _parse_endpoint(endpoint)
+            key = (host, port)
+            task = endpoint_probes.get(key)
+            if task is None:
+                task = asyncio.create_task(probe_class(service_class))
+                endpoint_probes[key] = task
+            return await task
+
+        async def check_one(service_class: Type["BaseService"], name: str):
+            # Reuse an existing instance, but only create one if the class cannot be probed without it.
+            existing = snapshot.get(name)
+            instance = existing.instance if existing is not None else None
+
+            cached = self._avail_cache.get(name)
+            if cached is not None and time.monotonic() - cached[0] < self._avail_ttl:
+                return (name, instance, cached[1])
             try:
-                is_available = await instance.check_availability()
+                is_available = await probe(service_class)
             except Exception as e:
                 self.logger.exception("Error checking service %s: %s", name, e)
                 is_available = False
+            if is_available is None:
+                if instance is None:
+                    try:
+                        instance = service_class()
+                    except Exception as e:
+                        self.logger.exception("Error creating service %s: %s", name, e)
+                        return (name, None, False)
+                try:
+                    async with self._check_sem:
+                        is_available = await asyncio.wait_for(instance.check_availability(), self._check_timeout)
+                except asyncio.TimeoutError:
+                    self.logger.warning("Availability check of %s timed out", name)
+                    is_available = False
+                except Exception as e:
+                    self.logger.exception("Error checking service %s: %s", name, e)
+                    is_available = False
+            # Only positive answers are cached, a service that went down is probed again next round.
+            if is_available:
+                self._avail_cache[name] = (time.monotonic(), True)
+            else:
+                self._avail_cache.pop(name, None)
             return (name, instance, is_available)
 
-        tasks = [
-            asyncio.create_task(check_one(service_class, name, priority))
-            for service_class, name, priority in self.service_definitions
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=False)
+        async def safe_check_one(service_class: Type["BaseService"], name: str):
+            # one failing check must not abort the whole scan
+            try:
+                return await check_one(service_class, name)
+            except Exception as e:
+                self.logger.error("Availability check of %s failed: %s", name, e)
+                return (name, None, False)
+
+        # The lock is taken once to read the current records and once to swap in the new ones.
+        async with self._services_lock:
+            snapshot = dict(self.services)
+        definitions = list(self.service_definitions)
+        if hasattr(asyncio, "TaskGroup"):
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(safe_check_one(service_class, name)) for service_class, name, _ in definitions]
+            results = [task.result() for task in tasks]
+        else:
+            # Python < 3.11
+            results = await asyncio.gather(
+                *(safe_check_one(service_class, name) for service_class, name, _ in definitions)
+            )
 
         async with self._services_lock:
-            for name, instance, is_available in results:
-                self.services[name] = {"instance": instance, "available": is_available}
+            # start from the current records, get_best_service may have created instances meanwhile
+            new_services = dict(self.services)
+            for (service_class, _, priority), (name, instance, is_available) in zip(definitions, results):
+                existing = new_services.get(name)
+                if instance is None and existing is not None:
+                    instance = existing.instance
+                if existing is None:
+                    self._by_type[service_class.service_type].append(name)
+                if existing is None or existing.available != is_available:
+                    self._last_change_ts = time.monotonic()
+                new_services[name] = _ServiceRecord(service_class, priority, instance, is_available)
+            self.services = new_services
+            self._update_best_by_type()
+
+    def _update_best_by_type(self) -> None:
+        """
+        Recompute the best available service per service type. Must be called with _services_lock held.
+        """
+        best: Dict[str, str] = {}
+        for service_type in self._by_type:
+            name = self._find_best(service_type)
+            if name is not None:
+                best[service_type] = name
+        self._best_by_type = best
+
+    def _find_best(self, service_type: str) -> Optional[str]:
+        """
+        Return the name of the available service with the highest priority of the given type,
+        looking only at services of that type. Must be called with _services_lock held.
+        """
+        best: Optional[str] = None
+        best_priority = 0
+        for name in self._by_type.get(service_type, ()):
+            record = self.services[name]
+            if record.available and (best is None or record.priority > best_priority):
+                best = name
+                best_priority = record.priority
+        return best
+
+    def _get_instance(self, name: str) -> Optional["BaseService"]:
+        """
+        Return the instance of a service, creating it on first use. Returns None and marks
+        the service unavailable if it cannot be created. Must be called with _services_lock held.
+        """
+        record = self.services[name]
+        if record.instance is None:
+            try:
+                instance = record.service_class()
+            except Exception as e:
+                self.logger.exception("Error creating service %s: %s", name, e)
+                self.invalidate(name)
+                return None
+            record = _ServiceRecord(record.service_class, record.priority, instance, record.available)
+            self.services[name] = record
+        return record.instance
+
+    def invalidate(self, name: str) -> None:
+        """
+        Drop the cached availability of a service, e.g. after a call to it failed.
+        The service counts as unavailable until the next scan probes it again.
+        """
+        self._avail_cache.pop(name, None)
+        record = self.services.get(name)
+        if record is not None:
+            self.services[name] = _ServiceRecord(record.service_class, record.priority, record.instance, False)
+            self._last_change_ts = time.monotonic()
+            if self._best_by_type.get(record.type) == name:
+                del self._best_by_type[record.type]
 
     async def print_status_table(self) -> None:
         """
         Print a simple table of the current status of all services.
         """
-        lines = ["\nService Status:"]
-        lines.append(f"{'NAME':<25}{'TYPE':<8}{'PRIORITY':<10}{'AVAILABLE'}")
-        lines.append("-" * 55)
-
+        # the records are replaced, never mutated, so a shallow copy is a consistent snapshot
         async with self._services_lock:
-            data = [
-                (
-                    srv_name,
-                    srv_data["instance"].service_type if srv_data["instance"] else "N/A",
-                    srv_data["instance"].priority if srv_data["instance"] else "N/A",
-                    srv_data["available"],
-                )
-                for srv_name, srv_data in self.services.items()
-            ]
-        for name, srv_type, priority, available in data:
-            lines.append(f"{name:<25}{srv_type:<8}{priority:<10}{str(available)}")
+            snapshot = list(self.services.items())
+
+        row = "{:<25}{:<8}{:<10}{}".format
+        lines = [
+            "\nService Status:",
+            row("NAME", "TYPE", "PRIORITY", "AVAILABLE"),
+            "-" * 55,
+        ]
+        lines.extend(
+            row(name, record.type, record.priority, record.available)
+            for name, record in snapshot
+        )
         self.logger.info("\n".join(lines))
 
     async def get_best_service(self, service_type: str) -> Optional["BaseService"]:
@@ -220,18 +471,39 @@ class ServiceDiscovery:
         and has the highest priority (or whichever logic you prefer).
         Returns None if no such service is available.
         """
+        best: Optional["BaseService"] = None
         async with self._services_lock:
-            candidates = [
-                srv_data["instance"]
-                for srv_data in self.services.values()
-                if srv_data["instance"] and srv_data["instance"].service_type == service_type and srv_data["available"]
-            ]
-
-        if not candidates:
+            while best is None:
+                name = self._best_by_type.get(service_type)
+                if name is None:
+                    # the winner was invalidated, pick the next one from the last scan
+                    name = self._find_best(service_type)
+                    if name is None:
+                        break
+                    self._best_by_type[service_type] = name
+                # a service that cannot be created is marked unavailable, then the next one is tried
+                best = self._get_instance(name)
+
+        if best is None:
             await self.print_status_table()
             print()
             sys.exit(f"There is no {service_type} service available. You may want to run \"./docker/docker.sh\" to bring up local instances.")
 
-        candidates.sort(key=lambda x: x.priority, reverse=True)
-        self.logger.info(f"type: {service_type}, return {candidates[0].name}")
-        return candidates[0]
+        self.logger.info(f"type: {service_type}, return {best.name}")
+        return best
+
+
+_SERVICE_DISCOVERY: Optional[ServiceDiscovery] = None
+
+
+def get_service_discovery(service_definitions: Optional[List[BaseService]] = None) -> ServiceDiscovery:
+    """
+    Return the shared ServiceDiscovery, creating it on the first call. The service
+    definitions are only used by that first call.
+    """
+    global _SERVICE_DISCOVERY
+    if _SERVICE_DISCOVERY is None:
+        _SERVICE_DISCOVERY = ServiceDiscovery(service_definitions=service_definitions)
+    elif service_definitions is not None:
+        _SERVICE_DISCOVERY.logger.warning("ServiceDiscovery already exists, ignoring the given service definitions")
+    return _SERVICE_DISCOVERY
@@ -1,16 +1,239 @@
+import asyncio
+import inspect
 import os
+import random
+import time
 from abc import ABCMeta, abstractmethod
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+import aiohttp
+import httpx
+import openai
 
 from mate.services import BaseService
 from mate.services.llm.prompt_manager_interface import PromptManager
 
+# streamed chat tokens are collected until this many characters or seconds are reached
+_FLUSH_BYTES = 64
+_FLUSH_SECONDS = 0.05
+
+# streamed chunks read ahead of a slow consumer before reading from the connection pauses
+_PREFETCH_CHUNKS = 64
+
+# read buffer of the HTTP sessions, large enough for big streamed frames
+_READ_BUFSIZE = 10 * 1024 * 1024
+# connection pool limits of the httpx clients used by the ollama and openai SDKs
+HTTPX_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# upper bound of the time spent retrying one call
+_RETRY_BUDGET_SECONDS = 120.0
+
+T = TypeVar("T")
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """
+    Rate limits, server errors and connection problems are worth another try, other errors are not.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status > 0:
+        return status == 429 or status >= 500
+    return isinstance(
+        error,
+        (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)
+    )
+
+
+async def _close_stream(stream) -> None:
+    """
+    Close a streamed response, the openai SDK streams have close() and async generators aclose().
+    """
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
 
 class LlmInterface(BaseService, metaclass=ABCMeta):
+    service_type = "LLM"
+    __slots__ = ("_session", "_avail_cache", "_avail_lock")
+
+    # seconds an availability answer is reused before the service is asked again
+    _avail_ttl: float = 10.0
 
     def __init__(self, name: str, priority: int):
-        super().__init__(name, "LLM", priority)
+        super().__init__(name, priority)
+        # HTTP session of the instance, created on first use and kept alive between calls
+        self._session: Optional[aiohttp.ClientSession] = None
+        # (monotonic timestamp, result) of the last availability check
+        self._avail_cache: Optional[Tuple[float, bool]] = None
+        # serializes the probes, concurrent callers wait for the running one and reuse its answer
+        self._avail_lock: Optional[asyncio.Lock] = None
+
+    async def check_availability(self) -> bool:
+        cached = self._cached_availability()
+        if cached is not None:
+            return cached
+        if self._avail_lock is None:
+            self._avail_lock = asyncio.Lock()
+        async with self._avail_lock:
+            cached = self._cached_availability()
+            if cached is not None:
+                return cached
+            now = time.monotonic()
+            result = await self._probe_availability()
+            self._avail_cache = (now, result)
+            return result
+
+    def _cached_availability(self) -> Optional[bool]:
+        if self._avail_cache is not None and time.monotonic() - self._avail_cache[0] < self._avail_ttl:
+            return self._avail_cache[1]
+        return None
+
+    def invalidate_availability(self) -> None:
+        """
+        Forget the last availability answer, e.g. after a chat failed.
+        """
+        self._avail_cache = None
 
     @abstractmethod
-    async def chat(self, full_chat) -> AsyncGenerator[str, None]:
+    async def _probe_availability(self) -> bool:
+        """
+        Ask the service whether it is usable, called by check_availability when the cached answer expired.
+        """
         pass
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=2, connect=1),
+                headers={"Accept-Encoding": "gzip, deflate", "User-Agent": "steamdeck-mate/1.0"},
+                read_bufsize=_READ_BUFSIZE,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @abstractmethod
+    async def chat(self, full_chat, immediate: bool = False) -> AsyncGenerator[str, None]:
+        """
+        Stream the answer to the chat. The tokens are coalesced into larger chunks
+        unless immediate is set.
+        """
+        pass
+
+    async def _with_retry(self, coro_factory: Callable[[], Awaitable[T]], max_attempts: int = 5) -> T:
+        """
+        Await coro_factory() and retry transient failures with a growing, jittered delay.
+        Only use it for calls that are safe to repeat.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _RETRY_BUDGET_SECONDS
+        for attempt in range(max_attempts):
+            try:
+                return await coro_factory()
+            except Exception as e:
+                delay = random.uniform(2, 4) * (attempt + 1)
+                if not _is_retryable(e) or attempt + 1 == max_attempts or loop.time() + delay > deadline:
+                    raise
+                self.logger.warning(f"{self.name}: attempt {attempt + 1} failed ({e!r}), retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _stream_with_retry(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterator[T]]]
+    ) -> AsyncGenerator[T, None]:
+        """
+        Open a streamed response and retry until its first chunk arrived. Once something was
+        yielded the stream is not repeated, errors after that are raised to the caller.
+        """
+        async def first_chunk() -> Tuple[AsyncIterator[T], AsyncIterator[T], Optional[Tuple[T]]]:
+            stream = await open_stream()
+            try:
+                iterator = stream.__aiter__()
+                return stream, iterator, (await iterator.__anext__(),)
+            except StopAsyncIteration:
+                return stream, iterator, None
+            except BaseException:
+                await _close_stream(stream)
+                raise
+
+        stream, iterator, head = await self._with_retry(first_chunk)
+        # close the response even if the consumer stops early, so the connection goes back to the pool
+        try:
+            if head is None:
+                return
+            yield head[0]
+            # continue the iterator that produced the first chunk, a new one may start over
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await _close_stream(stream)
+
+    @staticmethod
+    async def _prefetch(chunks: AsyncIterator[T], maxsize: int = _PREFETCH_CHUNKS) -> AsyncGenerator[T, None]:
+        """
+        Read chunks in a background task while the consumer is busy, e.g. speaking. At most
+        maxsize chunks are buffered, then the task stops reading and TCP backpressure slows
+        the server down. Errors of the stream are raised to the consumer.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize)
+        end = object()
+
+        async def produce() -> None:
+            try:
+                async for chunk in chunks:
+                    await queue.put((chunk, None))
+                await queue.put((end, None))
+            except Exception as e:
+                await queue.put((end, e))
+            finally:
+                aclose = getattr(chunks, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if error is not None:
+                    raise error
+                if chunk is end:
+                    return
+                yield chunk
+        finally:
+            producer.cancel()
+            await asyncio.wait([producer])
+
+    @staticmethod
+    async def _coalesce(chunks: AsyncIterator[str], immediate: bool = False) -> AsyncGenerator[str, None]:
+        """
+        Join small streamed chunks and yield them once _FLUSH_BYTES characters are collected
+        or _FLUSH_SECONDS passed since the last yield. The rest is flushed at the end.
+        """
+        if immediate:
+            async for chunk in chunks:
+                yield chunk
+            return
+        loop = asyncio.get_running_loop()
+        parts: List[str] = []
+        size = 0
+        last = loop.time()
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            parts.append(chunk)
+            size += len(chunk)
+            now = loop.time()
+            if size >= _FLUSH_BYTES or now - last > _FLUSH_SECONDS:
+                yield "".join(parts)
+                parts.clear()
+                size = 0
+                last = now
+        if parts:
+            yield "".join(parts)
@@ -1,101 +1,130 @@
 import abc
-import os
-import aiohttp
-
 import logging
+
 from urllib.parse import urlparse
-from ollama import Client
-from typing import Any, Dict, List, Optional, AsyncGenerator
-from mate.services.llm.llm_interface import LlmInterface
+import asyncio
+import aiohttp
+import orjson
+from ollama import AsyncClient
+from typing import Dict, FrozenSet, List, Optional, AsyncGenerator
+from mate.services.llm.llm_interface import LlmInterface, HTTPX_LIMITS
 
 
 class LlmOllamaRemote(LlmInterface, metaclass=abc.ABCMeta):
+    __slots__ = (
+        "llm_endpoint", "_host", "_port", "_models_url", "_show_url", "llm_provider_model",
+        "client", "_client_loop", "model", "_tags_etag", "_installed_models",
+    )
+
     def __init__(self, name: str, priority: int, endpoint: str, ollama_model: str) -> None:
         super().__init__(name, priority)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.logger.debug(f"Creating instance name={name}")
         self.llm_endpoint: str = endpoint
+        # the endpoint never changes, so the URLs used by the availability check are built once
+        parsed = urlparse(endpoint)
+        self._host: Optional[str] = parsed.hostname
+        self._port: Optional[int] = parsed.port
+        self._models_url: str = f"{parsed.scheme}://{self._host}:{self._port}/api/tags"
+        self._show_url: str = f"{parsed.scheme}://{self._host}:{self._port}/api/show"
         self.llm_provider_model: str = ollama_model
-        self.client: Client = Client(host=self.llm_endpoint)
+        # created on the first chat, so it belongs to the event loop that uses it
+        self.client: Optional[AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
         self.model: str = self.llm_provider_model
+        # ETag and model list of the last /api/tags answer, reused on 304 Not Modified
+        self._tags_etag: Optional[str] = None
+        self._installed_models: FrozenSet[str] = frozenset()
 
-    # Function to dynamically create a class that inherits from base_class
-    async def create_class_from_config(class_name: str, base_class: type, config: Dict[str, Any]) -> type:
-        # Define an __init__ that passes config parameters to the base class constructor.
-        def __init__(self):
-            # You can also include additional logic here if needed.
-            super(new_class, self).__init__(**config)
-
-        # Create the new class dynamically.
-        new_class = type(class_name, (base_class,), {
-            "config": config,  # Optional: store config as a class attribute
-            "__init__": __init__
-        })
-        return new_class
-
-    async def chat(self, full_chat: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
-        print(f"LLM CHAT: {full_chat}")
-        content = self.client.chat(
+    async def chat(self, full_chat: List[Dict[str, str]], immediate: bool = False) -> AsyncGenerator[str, None]:
+        if self.logger.isEnabledFor(logging.DEBUG) and full_chat:
+            self.logger.debug("chat(len=%d, last=%r)", len(full_chat), full_chat[-1].get("content", "")[:200])
+        stream = self._prefetch(self._stream_with_retry(lambda: self._get_client().chat(
             model=self.model,
             stream=True,
             messages=full_chat,
-        )
-        for chunk in content:
-            c = chunk["message"]["content"]
-            yield c
+        )))
+        try:
+            async for text in self._coalesce((chunk["message"]["content"] async for chunk in stream), immediate):
+                yield text
+        finally:
+            await stream.aclose()
+
+    def _get_client(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self.client is None or self._client_loop is not loop:
+            self.client = AsyncClient(host=self.llm_endpoint, limits=HTTPX_LIMITS)
+            self._client_loop = loop
+        return self.client
 
     def config_str(self) -> str:
         return f"Ollama Remote {self.name}: {self.model} on {self.llm_endpoint}."
 
-    async def check_availability(self) -> bool:
+    async def _probe_availability(self) -> bool:
         self.logger.debug(f"[check_availability {self.name}] Checking availability of {self.model} on {self.llm_endpoint}")
 
-        if not await self.__check_remote_endpoint__(self.llm_endpoint):
-            self.logger.debug(f"[check_availability {self.name}] Remote endpoint {self.llm_endpoint} is not reachable")
-            return False
-
-        parsed = urlparse(self.llm_endpoint)
-        host: Optional[str] = parsed.hostname
-        port: Optional[int] = parsed.port
-        models_url: str = f"{parsed.scheme}://{host}:{port}/api/tags"
-
-        self.logger.debug(f"[check_availability {self.name}] Checking models at {models_url}")
+        self.logger.debug(f"[check_availability {self.name}] Checking model at {self._show_url}")
 
         try:
-            timeout = aiohttp.ClientTimeout(total=2)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(models_url) as resp:
-                    if resp.status != 200:
-                        self.logger.warning(
-                            "[check_availability %s] Could not retrieve models from %s. HTTP status: %d",
-                            self.name,
-                            models_url,
-                            resp.status
-                        )
-                        self.logger.debug(f"[check_availability {self.name}] Failed with HTTP status {resp.status}, expected 200")
-                        return False
-                    data = await resp.json()
-                    installed_models = [m.get("name") for m in data.get("models", [])]
-                    self.logger.debug(f"[check_availability {self.name}] Found installed models: {installed_models}")
+            session = await self._get_session()
+            # /api/show answers 404 for a missing model, older servers expect "name" instead of "model"
+            async with session.post(self._show_url, json={"model": self.model, "name": self.model}) as resp:
+                status = resp.status
+        except (aiohttp.ClientConnectorError, asyncio.TimeoutError):
+            # the request itself tells whether the server is reachable, no separate connection probe needed
+            self.logger.debug(f"[check_availability {self.name}] Remote endpoint {self.llm_endpoint} is not reachable")
+            return False
         except Exception as e:
             self.logger.warning(
                 "[check_availability %s] Failed while calling %s. Reason: %s",
                 self.name,
-                models_url,
+                self._show_url,
                 e
             )
             self.logger.debug(f"[check_availability {self.name}] Exception details: {str(e)}")
             return False
 
-        if self.model not in installed_models:
+        if status == 404:
+            # only list the installed models to explain the failure
+            if self.logger.isEnabledFor(logging.WARNING):
+                installed_models = await self._list_installed_models()
+                self.logger.warning(
+                    "[check_availability %s] Model '%s' not found in installed models: %s",
+                    self.name,
+                    self.model,
+                    sorted(installed_models)
+                )
+            self.logger.debug(f"[check_availability {self.name}] Required model '{self.model}' is not installed on the server")
+            return False
+        if status != 200:
             self.logger.warning(
-                "[check_availability %s] Model '%s' not found in installed models: %s",
+                "[check_availability %s] Could not check model at %s. HTTP status: %d",
                 self.name,
-                self.model,
-                installed_models
+                self._show_url,
+                status
             )
-            self.logger.debug(f"[check_availability {self.name}] Required model '{self.model}' is not installed on the server")
             return False
 
         self.logger.debug(f"[check_availability {self.name}] Model '{self.model}' is available and ready to use")
-        return True
\ No newline at end of file
+        return True
+
+    async def _list_installed_models(self) -> FrozenSet[str]:
+        """
+        Return the names of the models installed on the server, or an empty set if they
+        cannot be retrieved. Answers 304 Not Modified with the list of the last call.
+        """
+        try:
+            session = await self._get_session()
+            headers = {"If-None-Match": self._tags_etag} if self._tags_etag else None
+            async with session.get(self._models_url, headers=headers) as resp:
+                if resp.status == 304:
+                    return self._installed_models
+                if resp.status != 200:
+                    self.logger.debug(f"[check_availability {self.name}] Could not retrieve models from {self._models_url}. HTTP status: {resp.status}")
+                    return frozenset()
+                data = orjson.loads(await resp.read())
+                self._tags_etag = resp.headers.get("ETag")
+        except Exception as e:
+            self.logger.debug(f"[check_availability {self.name}] Failed while calling {self._models_url}. Reason: {e}")
+            return frozenset()
+        self._installed_models = frozenset(m["name"] for m in data.get("models", ()) if "name" in m)
+        return self._installed_models
@@ -1,18 +1,24 @@
-import logging
 import os
-from typing import AsyncGenerator, Dict, List, Optional, Union
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import aiohttp
-from openai import AsyncOpenAI, OpenAI
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient
 
-from mate.services.llm.llm_interface import LlmInterface
+from mate.services.llm.llm_interface import LlmInterface, HTTPX_LIMITS
+
+# longest chat whose prepared messages are kept for the next call
+_PREP_CACHE_TURNS = 128
+
+# clients shared by all instances with the same (base_url, api_key), they share one connection pool
+_CLIENT_CACHE: Dict[Tuple[str, str], AsyncOpenAI] = {}
 
 
 class LlmOpenrouterGpt(LlmInterface):
     """
     Implementation of LLM interface for OpenRouter GPT models.
     """
+    __slots__ = ("api_key", "base_url", "model", "client", "_prep_keys", "_prep_cache")
 
     def __init__(self, name: str, priority: int, model: str, ):
         super().__init__(name, priority)
@@ -20,11 +26,13 @@ class LlmOpenrouterGpt(LlmInterface):
         self.base_url = "https://openrouter.ai/api/v1"
         self.model = model
         self.client = None
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        # (role, content) and prepared message of each turn of the last multimodal chat
+        self._prep_keys: List[Tuple[str, Any]] = []
+        self._prep_cache: List[Optional[Dict[str, Any]]] = []
         if not self.api_key:
             self.logger.warning("OpenRouter API key not set")
 
-    async def check_availability(self) -> bool:
+    async def _probe_availability(self) -> bool:
         """
         Check if the OpenRouter API is available and properly configured.
         """
@@ -37,20 +45,19 @@ class LlmOpenrouterGpt(LlmInterface):
         if not host:
             return False
         try:
-            # Create a temporary client to test connectivity
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/models",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    timeout=5,
-                ) as response:
-                    if response.status == 200:
-                        return True
-                    else:
-                        self.logger.warning(
-                            f"OpenRouter API returned status {response.status}"
-                        )
-                        return False
+            session = await self._get_session()
+            async with session.get(
+                f"{self.base_url}/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                if response.status == 200:
+                    return True
+                else:
+                    self.logger.warning(
+                        f"OpenRouter API returned status {response.status}"
+                    )
+                    return False
         except Exception as e:
             self.logger.warning(f"Failed to connect to OpenRouter API: {e}")
             return False
@@ -67,77 +74,125 @@ class LlmOpenrouterGpt(LlmInterface):
 
     def _init_client(self):
         """Initialize the OpenAI client with OpenRouter configuration"""
-        if not self.client:
-            self.client = AsyncOpenAI(
-                base_url=self.base_url,
-                api_key=self.api_key,
-            )
-
-    async def chat(self, full_chat) -> AsyncGenerator[str, None]:
+        if self.client is None or self.client.is_closed():
+            key = (self.base_url, self.api_key)
+            client = _CLIENT_CACHE.get(key)
+            if client is None or client.is_closed():
+                client = AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    http_client=DefaultAsyncHttpxClient(limits=HTTPX_LIMITS),
+                )
+                _CLIENT_CACHE[key] = client
+            self.client = client
+
+    async def close(self) -> None:
+        await super().close()
+        if self.client is not None:
+            # the shared client is closed for all instances, they create a new one on their next chat
+            key = (self.base_url, self.api_key)
+            if _CLIENT_CACHE.get(key) is self.client:
+                del _CLIENT_CACHE[key]
+            await self.client.close()
+            self.client = None
+
+    async def chat(self, full_chat, immediate: bool = False) -> AsyncGenerator[str, None]:
         """
         Send a chat request to OpenRouter and stream the response.
 
         Args:
             full_chat: List of message dictionaries with 'role' and 'content' keys
                        Content can be text or a list of content parts (for multimodal)
+            immediate: Yield every token as it arrives instead of coalescing them
 
         Yields:
             Chunks of the generated response as they become available
         """
         self._init_client()
 
+        stream = None
         try:
             # Prepare messages for the API
             messages = self._prepare_messages(full_chat)
 
             # Create the streaming completion
-            stream = await self.client.chat.completions.create(
+            stream = self._prefetch(self._stream_with_retry(lambda: self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 stream=True,
                 extra_headers={
                 },
-            )
+            )))
 
-            # Yield chunks as they arrive
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            # Yield chunks as they arrive, joined into larger pieces
+            deltas = (
+                chunk.choices[0].delta.content
+                async for chunk in stream
+                if chunk.choices and chunk.choices[0].delta.content
+            )
+            async for text in self._coalesce(deltas, immediate):
+                yield text
 
         except Exception as e:
             self.logger.error(f"Error in OpenRouter chat: {e}")
+            self.invalidate_availability()
             yield f"\nError: Failed to get response from OpenRouter: {str(e)}"
+        finally:
+            # hand the connection back to the pool when the consumer stopped reading early
+            if stream is not None:
+                await stream.aclose()
 
     def _prepare_messages(self, full_chat):
         """
         Prepare messages for the OpenRouter API, handling both simple text
         and multimodal content.
         """
-        messages = []
-
-        for msg in full_chat:
+        # plain text chats, the common case, can be sent as they are
+        if all(isinstance(msg.get("content", ""), str) for msg in full_chat):
+            return full_chat if isinstance(full_chat, list) else list(full_chat)
+
+        # the start of the conversation is the same as in the last call, reuse what was prepared then
+        keys: List[Tuple[str, Any]] = []
+        prepared: List[Optional[Dict[str, Any]]] = []
+        reuse = True
+        for i, msg in enumerate(full_chat):
             role = msg.get("role", "user")
             content = msg.get("content", "")
-
-            # Handle different content formats
-            if isinstance(content, str):
-                messages.append({"role": role, "content": content})
-            elif isinstance(content, list):
-                # This is multimodal content
-                processed_content = []
-
-                for item in content:
-                    if item.get("type") == "text":
-                        processed_content.append({
-                            "type": "text",
-                            "text": item.get("text", "")
-                        })
-                    elif item.get("type") == "image_url":
-                        processed_content.append({
-                            "type": "image_url",
-                            "image_url": item.get("image_url", {})
-                        })
-
-                messages.append({"role": role, "content": processed_content})
-
-        return messages
\ No newline at end of file
+            if reuse and i < len(self._prep_keys) and self._same_message(self._prep_keys[i], role, content):
+                keys.append(self._prep_keys[i])
+                prepared.append(self._prep_cache[i])
+                continue
+            reuse = False
+            keys.append((role, content))
+            prepared.append(self._prepare_message(role, content))
+
+        if len(keys) <= _PREP_CACHE_TURNS:
+            self._prep_keys, self._prep_cache = keys, prepared
+        else:
+            self._prep_keys, self._prep_cache = [], []
+        return [message for message in prepared if message is not None]
+
+    @staticmethod
+    def _same_message(key: Tuple[str, Any], role: str, content: Any) -> bool:
+        # multimodal content is compared by identity, the kept reference prevents id reuse
+        return key[0] == role and (key[1] is content or (isinstance(content, str) and key[1] == content))
+
+    def _prepare_message(self, role: str, content: Any) -> Optional[Dict[str, Any]]:
+        # Handle different content formats
+        if isinstance(content, str):
+            return {"role": role, "content": content}
+        if isinstance(content, list):
+            # This is multimodal content
+            processed_content = [
+                self._prepare_content_part(item)
+                for item in content
+                if item.get("type") in ("text", "image_url")
+            ]
+            return {"role": role, "content": processed_content}
+        return None
+
+    @staticmethod
+    def _prepare_content_part(item):
+        if item["type"] == "text":
+            return {"type": "text", "text": item.get("text", "")}
+        return {"type": "image_url", "image_url": item.get("image_url", {})}
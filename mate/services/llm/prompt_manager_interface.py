@@ -1,94 +1,189 @@
 import logging
 import datetime
+import re
+import sys
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from enum import Enum
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from functools import lru_cache
+from itertools import chain
+from string import Formatter
+from textwrap import dedent
+from typing import Any, DefaultDict, Deque, Dict, FrozenSet, Generic, Iterable, Iterator, List, MutableSequence, Optional, Protocol, Sequence, Tuple, TypeVar
+
+import orjson
 
 
 # Define Modes
 class Mode(Enum):
-    EXIT = """
+    EXIT = auto()
+    GARBAGEINPUT = auto()
+    LEDCONTROL = auto()
+    STATUS = auto()
+    CHAT = auto()
+    MODUS_SELECTION = auto()
+
+
+# rule of each mode for the mode selection prompt
+MODE_DESCRIPTIONS: Dict[Mode, str] = {
+    Mode.EXIT: dedent("""
     Wähle EXIT wenn der User das Gespräch beenden oder abbrechen will oder sich verabschieded hat.
-    """
-    GARBAGEINPUT = """
+    """).strip(),
+    Mode.GARBAGEINPUT: dedent("""
     Wähle GARBAGEINPUT wenn die Anfrage unverständlich oder unvollständig erscheint.
-    """
-    LEDCONTROL = """
+    """).strip(),
+    Mode.LEDCONTROL: dedent("""
     Wähle LEDCONTROL wenn der User die Beleuchtung oder das Licht verändern, ein oder ausschalten möchte.
-    """
-    STATUS = """
+    """).strip(),
+    Mode.STATUS: dedent("""
     Wähle STATUS wenn der User von Geräten (Fernseher, Verstärker) oder Dinge ein- oder ausschalten will (ausser wenn es um Licht geht).
-    """
-    CHAT = """
+    """).strip(),
+    Mode.CHAT: dedent("""
     Wähle CHAT wenn der User eine andere bisher nicht genannte Frage gestellt hat, oder sonstiger Small Talk oder verständlichen Satz ohne Bezug zu den anderen Themen. Im Zweifel diese Option wählen wenn der Input eine valide Frage darstellt.
+    """).strip(),
+}
+
+
+# the modes the selection prompt can choose from
+_ACTIVE_MODES = tuple(m for m in Mode if m is not Mode.MODUS_SELECTION)
+
+
+_MODE_NAMES_CSV: str = ", ".join(m.name for m in _ACTIVE_MODES)
+_MODE_RULES: str = "\n".join(f"- {MODE_DESCRIPTIONS[m]}" for m in _ACTIVE_MODES if m in MODE_DESCRIPTIONS)
+
+
+def _build_modus_selection_prompt() -> str:
+    return (
+        f"Du musst genau einen der folgenden Modi (GROSSBUCHSTABEN) wählen: {_MODE_NAMES_CSV}\n"
+        f"Beginne deine Antwort, indem du den gewählten Modus in GROSSBUCHSTABEN nennst (z. B. \"EXIT\"). "
+        f"Beende deine Antwort danach. Keine weiteren Erklärungen, Haftungsausschlüsse oder zusätzlicher Text.\n\n"
+        f"Befolge diese Regeln strikt:\n{_MODE_RULES}"
+    )
+
+
+# the routing prompt is built once, so every request starts with the same bytes
+_MODUS_SELECTION_PROMPT: str = _build_modus_selection_prompt()
+
+
+_SPACE_RUNS = re.compile(r"[ \t]+")
+
+
+def _canon(text: str) -> str:
+    """
+    Dedent the text, collapse runs of spaces and tabs and drop trailing whitespace. Newlines are kept.
+    """
+    text = _SPACE_RUNS.sub(" ", dedent(text))
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+# a template as (literal text, field name or None) parts, see _compile_template
+_CompiledTemplate = Tuple[Tuple[str, Optional[str]], ...]
+
+
+def _compile_template(template: str) -> _CompiledTemplate:
+    """
+    Parse a format string once. Only plain named fields like {name} are supported.
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(template):
+        if field_name is not None and (
+            not field_name.isidentifier() or format_spec or conversion
+        ):
+            raise ValueError(f"Unsupported placeholder {{{field_name}}} in prompt template")
+        parts.append((literal, field_name))
+    return tuple(parts)
+
+
+def _render_template(compiled: _CompiledTemplate, context: Dict[str, str]) -> str:
+    # missing context values are rendered as empty strings
+    return "".join(
+        literal if name is None else literal + str(context.get(name, ""))
+        for literal, name in compiled
+    )
+
+
+@dataclass(slots=True, frozen=True)
+class HistoryEntry(Mapping):
     """
-    MODUS_SELECTION = ''
+    One message of a history. It reads like the {"role": ..., "content": ...} dicts of the
+    LLM APIs, to_openai_dict() gives such a dict for clients that need a real one.
+    """
+    role: str
+    content: str
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(("role", "content"))
+
+    def __len__(self) -> int:
+        return 2
+
+    def to_openai_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PromptTemplate:
     mode: Mode
     system_prompt: str
     user_say_str: str
     description: str
+    # per-turn part of the system prompt, placed after the static system_prompt so the latter stays a
+    # byte-identical prefix that providers can cache
+    system_prompt_dynamic: str = ""
+    # set in __post_init__, templates without placeholders are returned as they are
+    _has_placeholders: bool = field(init=False, repr=False, compare=False)
+    _compiled: _CompiledTemplate = field(init=False, repr=False, compare=False)
+    _compiled_dynamic: _CompiledTemplate = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # canonical whitespace saves tokens and keeps the prompt bytes stable across code edits
+        # the templates are frozen, so the computed fields are set through object.__setattr__
+        object.__setattr__(self, "system_prompt", _canon(self.system_prompt))
+        object.__setattr__(self, "system_prompt_dynamic", _canon(self.system_prompt_dynamic))
+        # the templates are parsed and validated once here instead of by str.format on every call
+        object.__setattr__(self, "_compiled", _compile_template(self.system_prompt))
+        object.__setattr__(self, "_compiled_dynamic", _compile_template(self.system_prompt_dynamic))
+        object.__setattr__(self, "_has_placeholders", any(name is not None for _, name in self._compiled))
+        # fixed phrases, interned so comparisons with them are pointer checks
+        object.__setattr__(self, "user_say_str", sys.intern(self.user_say_str))
 
     def format_prompt(self, context_data: Optional[Dict[str, str]] = None) -> str:
-        if context_data is None:
-            context_data = {}
-        system_prompt_formatted: str = self.system_prompt.format(**context_data)
-        return system_prompt_formatted
+        if not self._has_placeholders:
+            return self.system_prompt
+        return _render_template(self._compiled, context_data or {})
 
+    def format_dynamic_prompt(self, context_data: Optional[Dict[str, str]] = None) -> str:
+        if not self.system_prompt_dynamic:
+            return ""
+        return _render_template(self._compiled_dynamic, context_data or {})
 
-H = TypeVar("H")  # History type
-E = TypeVar("E")  # Entry type
 
-GLOBAL_BASE_TEMPLATES: Dict[str, PromptTemplate] = {
-    Mode.MODUS_SELECTION.name: PromptTemplate(
-        mode=Mode.MODUS_SELECTION,
-        description="Modus Auswahl",
-        system_prompt=(
-                "Du musst genau einen der folgenden Modi (GROSSBUCHSTABEN) wählen: "
-                f"{', '.join([mode.name for mode in Mode if mode != Mode.MODUS_SELECTION])}\n"
-                "Beginne deine Antwort, indem du den gewählten Modus in GROSSBUCHSTABEN nennst (z. B. \"EXIT\"). "
-                "Beende deine Antwort danach. Keine weiteren Erklärungen, Haftungsausschlüsse oder zusätzlicher Text.\n\n"
-                "Befolge diese Regeln strikt:\n"
-                + "\n".join(f"- {m.value}" for m in Mode if m.value)
-        ),
-        user_say_str=""
-    ),
-    Mode.CHAT.name: PromptTemplate(
-        mode=Mode.CHAT,
-        description="Live Chat Modus",
-        system_prompt=(
-            "Beantworte die Fragen als freundlicher und zuvorkommender Helfer. "
-            "Antworte kindergerecht für Kinder ab acht Jahren. "
-            "Antworte maximal mit 1 bis 3 kurzen Sätzen und stelle Gegenfragen, wenn der Sachverhalt unklar ist."
-        ),
-        user_say_str="Lass uns etwas plaudern, Modus ist nun CHAT"
-    ),
-    Mode.LEDCONTROL.name: PromptTemplate(
-        mode=Mode.LEDCONTROL,
-        description="LED Kontroll Modus",
-        system_prompt="""
-Du steuerst LED-Lichter per JSON requests. 
-Der User möchte sie möglicherweise ein- oder ausschalten oder die Farbe oder Helligkeit ändern. 
+_fromtimestamp = datetime.datetime.fromtimestamp
+_UTC = datetime.timezone.utc
 
-Parameter und mögliche Werte:
-- action: on, off. Nur off wenn User Dunkelheit will oder das Licht ausgeschalten werden soll und kein Licht mehr an sein soll. Immer on wählen wenn etwas am Licht verändret werden soll.
-- rgbww: Array mit fünf Elementen: Rot, Grün, Blau, kaltes Weiß, warmes Weiß (jeweils von 0 bis 255).
-- colortemp: Farbtemperatur setzen (2200K bis 6500K).
-- brightness: Helligkeit anpassen, dünkler oder heller (Wertebereich 10–255).
-- scene von 1 bis 32 ruft vordefinierte (oft dynamische) Szenen auf.  
-- scene 0 wird für benutzerdefinierte Farben oder Farbtemperaturen genutzt.  
-- speed (0–100) ist nur für dynamische Szenen relevant und bestimmt die Geschwindigkeit der Farbübergänge.    
-- temp oder rgbww werden nur beachtet, wenn sceneId = 0. 
+# indexed by datetime.weekday(), avoids the locale dependent %A of strftime
+_WEEKDAYS = ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag")
 
-Stelle sicher, dass deine endgültige Ausgabe ein kurzes JSON-Snippet im folgendem Format ist:
-Der action parameter ist mandatory, andere parameter sind je nach Modus zu wählen.
 
-Scene ID Reference (Tabelle)
+@lru_cache(maxsize=1)
+def _timestamp_for_minute(epoch_minute: int) -> str:
+    # the timestamp has minute resolution, so it is formatted once per minute
+    now = _fromtimestamp(epoch_minute * 60, _UTC)
+    return f"Es ist {_WEEKDAYS[now.weekday()]}, der {now.day:02d}.{now.month:02d}.{now.year} um {now.hour:02d}:{now.minute:02d} UTC. "
 
+
+# reference of the LED scenes, filled into the {scene_table} placeholder of the LEDCONTROL prompt
+_LED_SCENE_TABLE: str = _canon("""
 | scene | Scene Name   | Beschreibung / Hinweise                                                      | Statisch oder Dynamisch? | Typischerweise relevante Parameter 
 |--------------|-------------------|----------------------------------------------------------------------------------|------------------------------|----------------------------|
 | 1            | Ocean            | Langsame Farbwechsel in Blau- und Grüntönen.                                      | Dynamisch                    |  speed |
@@ -123,22 +218,70 @@ Scene ID Reference (Tabelle)
 | 30           | Golden white     | Etwas wärmeres Weiß als „Warm White“.                                            | Statisch                     |          |
 | 31           | Pulse            | Pulsierende, kräftige Farbzyklen.                                                | Dynamisch                    |  speed  |
 | 32           | Steampunk        | Warme Bernstein-Übergänge mit leichtem „mechanischen“ Flacker-Effekt.           | Dynamisch                    |  speed   |
+""")
+
+# context every system prompt is formatted with, values given by the caller take precedence
+_DEFAULT_PROMPT_CONTEXT: Dict[str, str] = {"scene_table": _LED_SCENE_TABLE}
+
+H = TypeVar("H")  # History type
+E = TypeVar("E")  # Entry type
+
+GLOBAL_BASE_TEMPLATES: Dict[Mode, PromptTemplate] = {
+    Mode.MODUS_SELECTION: PromptTemplate(
+        mode=Mode.MODUS_SELECTION,
+        description="Modus Auswahl",
+        system_prompt=_MODUS_SELECTION_PROMPT,
+        user_say_str=""
+    ),
+    Mode.CHAT: PromptTemplate(
+        mode=Mode.CHAT,
+        description="Live Chat Modus",
+        system_prompt=(
+            "Beantworte die Fragen als freundlicher und zuvorkommender Helfer. "
+            "Antworte kindergerecht für Kinder ab acht Jahren. "
+            "Antworte maximal mit 1 bis 3 kurzen Sätzen und stelle Gegenfragen, wenn der Sachverhalt unklar ist."
+        ),
+        user_say_str="Lass uns etwas plaudern, Modus ist nun CHAT"
+    ),
+    Mode.LEDCONTROL: PromptTemplate(
+        mode=Mode.LEDCONTROL,
+        description="LED Kontroll Modus",
+        system_prompt="""
+Du steuerst LED-Lichter per JSON requests. 
+Der User möchte sie möglicherweise ein- oder ausschalten oder die Farbe oder Helligkeit ändern. 
+
+Parameter und mögliche Werte:
+- action: on, off. Nur off wenn User Dunkelheit will oder das Licht ausgeschalten werden soll und kein Licht mehr an sein soll. Immer on wählen wenn etwas am Licht verändret werden soll.
+- rgbww: Array mit fünf Elementen: Rot, Grün, Blau, kaltes Weiß, warmes Weiß (jeweils von 0 bis 255).
+- colortemp: Farbtemperatur setzen (2200K bis 6500K).
+- brightness: Helligkeit anpassen, dünkler oder heller (Wertebereich 10–255).
+- scene von 1 bis 32 ruft vordefinierte (oft dynamische) Szenen auf.  
+- scene 0 wird für benutzerdefinierte Farben oder Farbtemperaturen genutzt.  
+- speed (0–100) ist nur für dynamische Szenen relevant und bestimmt die Geschwindigkeit der Farbübergänge.    
+- temp oder rgbww werden nur beachtet, wenn sceneId = 0. 
+
+Stelle sicher, dass deine endgültige Ausgabe ein kurzes JSON-Snippet im folgendem Format ist:
+Der action parameter ist mandatory, andere parameter sind je nach Modus zu wählen.
+
+Scene ID Reference (Tabelle)
+
+{scene_table}
 
 Einige Beispiele:
-Wärmstes Licht: {'action': 'on', 'scene': 0, 'colortemp': 2200, 'brightness': 255}
-Tageslicht: {'action': 'on','scene': 12, 'colortemp': 4200, 'brightness': 255}
-Nachtlicht: {'action': 'on','scene': 14}
-Gemütlich: {'action': 'on','scene': 6, 'brightness': 255}
-Entspannung: {'action': 'on','scene': 16, 'brightness': 255}
-Color light with given rgb: {'action': 'on','rgbww': [255, 0, 0, 0, 0], 'scene': 0, 'brightness': 255}
-Animated Fireplace light: {'action': 'on','scene': 5, 'speed': 100, 'brightness': 255}
+Wärmstes Licht: {{'action': 'on', 'scene': 0, 'colortemp': 2200, 'brightness': 255}}
+Tageslicht: {{'action': 'on','scene': 12, 'colortemp': 4200, 'brightness': 255}}
+Nachtlicht: {{'action': 'on','scene': 14}}
+Gemütlich: {{'action': 'on','scene': 6, 'brightness': 255}}
+Entspannung: {{'action': 'on','scene': 16, 'brightness': 255}}
+Color light with given rgb: {{'action': 'on','rgbww': [255, 0, 0, 0, 0], 'scene': 0, 'brightness': 255}}
+Animated Fireplace light: {{'action': 'on','scene': 5, 'speed': 100, 'brightness': 255}}
 
 Beachte das rgbww ein Tupel mit 5 elementen ist.
 Beachte die wichtigste Regel strikt: Antworte mit EINER EINZELNEN JSON Ausgabe die den Endzustand beschreibt, und beende danach. Keine weiteren Erklärungen, Haftungsausschlüsse oder zusätzlicher Text.
 """,
         user_say_str=""
     ),
-    Mode.GARBAGEINPUT.name: PromptTemplate(
+    Mode.GARBAGEINPUT: PromptTemplate(
         mode=Mode.GARBAGEINPUT,
         description="Unverständlicher Input",
         system_prompt=(
@@ -147,47 +290,141 @@ Beachte die wichtigste Regel strikt: Antworte mit EINER EINZELNEN JSON Ausgabe d
         ),
         user_say_str=""
     ),
-    Mode.EXIT.name: PromptTemplate(
-        mode=Mode.STATUS,
-        description="Anzeigen des System Status",
+    Mode.EXIT: PromptTemplate(
+        mode=Mode.EXIT,
+        description="Beenden",
         system_prompt="",
         user_say_str=""
     ),
-    Mode.STATUS.name: PromptTemplate(
-        mode=Mode.EXIT,
-        description="Beenden",
+    Mode.STATUS: PromptTemplate(
+        mode=Mode.STATUS,
+        description="Anzeigen des System Status",
         system_prompt="",
         user_say_str=""
     ),
 }
 
 
+def _prompt_context(context_data: Optional[Dict[str, str]]) -> Dict[str, str]:
+    if not context_data:
+        return _DEFAULT_PROMPT_CONTEXT
+    return {**_DEFAULT_PROMPT_CONTEXT, **context_data}
+
+
+_DEFAULT_PROMPT_CONTEXT_KEY = frozenset(_DEFAULT_PROMPT_CONTEXT.items())
+
+
+@lru_cache(maxsize=64)
+def _system_prompt_for(template: PromptTemplate, context: FrozenSet[Tuple[str, str]]) -> str:
+    return template.format_prompt(dict(context))
+
+
+class BatchTokenizer(Protocol):
+    """
+    Counts the tokens of several texts in one call, e.g. with tiktoken's encode_batch.
+    """
+
+    def __call__(self, texts: Sequence[str]) -> Sequence[int]:
+        ...
+
+
 class ReductionStrategy(ABC):
     @abstractmethod
-    def reduce(self, history: List[Dict[str, str]], tokenize_fn: Any, token_limit: int) -> None:
+    def reduce(
+        self,
+        history: MutableSequence[Dict[str, str]],
+        tokenize_fn: Any,
+        token_limit: int,
+        batch_tokenize_fn: Optional[BatchTokenizer] = None,
+    ) -> None:
+        """
+        Remove entries from history in place until it fits into token_limit. The histories
+        of the prompt managers are deques, removing the oldest entry is O(1). When given,
+        batch_tokenize_fn counts all entries not known yet in one call instead of tokenize_fn.
+        """
+        pass
+
+    def add(self, entry: Dict[str, str], tokens: int) -> None:
+        """
+        Called with the token count of every entry added to a history, strategies may keep it.
+        """
         pass
 
 
 class RemoveOldestStrategy(ReductionStrategy):
+    logger = logging.getLogger(f"{__name__}.RemoveOldestStrategy")
+
     def __init__(self) -> None:
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        # token counts of the history entries by id(entry), the entry is kept to detect a reused id
+        self._token_counts: Dict[int, Tuple[Dict[str, str], int]] = {}
         self.logger.debug("RemoveOldestStrategy initialized.")
 
-    def reduce(self, history: List[Dict[str, str]], tokenize_fn: Any, token_limit: int) -> None:
-        while self.calculate_token_count(history, tokenize_fn) > token_limit and history:
-            removed_entry = history.pop(0)
-            self.logger.debug("Removed entry to reduce tokens: %s", removed_entry)
-
-    def calculate_token_count(self, history: List[Dict[str, str]], tokenize_fn: Any) -> int:
-        total_tokens: int = 0
-        for entry in history:
-            content: str = entry.get("content", "")
-            total_tokens += tokenize_fn(content)
-        self.logger.debug("Calculated total tokens: %d", total_tokens)
+    def add(self, entry: Dict[str, str], tokens: int) -> None:
+        self._token_counts[id(entry)] = (entry, tokens)
+
+    def remove_oldest(self, history: MutableSequence[Dict[str, str]]) -> Dict[str, str]:
+        # del history[0] is O(1) for a deque and still works for a list
+        entry = history[0]
+        del history[0]
+        self._token_counts.pop(id(entry), None)
+        return entry
+
+    def reduce(
+        self,
+        history: MutableSequence[Dict[str, str]],
+        tokenize_fn: Any,
+        token_limit: int,
+        batch_tokenize_fn: Optional[BatchTokenizer] = None,
+    ) -> None:
+        # every entry is tokenized at most once, then the total is kept up to date while removing
+        if batch_tokenize_fn is not None:
+            self._count_unknown(history, batch_tokenize_fn)
+        total_tokens: int = self.calculate_token_count(history, tokenize_fn)
+        debug: bool = self.logger.isEnabledFor(logging.DEBUG)
+        while total_tokens > token_limit and history:
+            total_tokens -= self._entry_tokens(history[0], tokenize_fn)
+            removed_entry = self.remove_oldest(history)
+            if debug:
+                self.logger.debug("Removed entry to reduce tokens: %r", removed_entry)
+        # forget entries that are not part of the history anymore, e.g. after it was emptied
+        self._token_counts = {id(entry): self._token_counts[id(entry)] for entry in history}
+
+    def calculate_token_count(self, history: Iterable[Dict[str, str]], tokenize_fn: Any) -> int:
+        entry_tokens = self._entry_tokens
+        total_tokens: int = sum(entry_tokens(entry, tokenize_fn) for entry in history)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Calculated total tokens: %d", total_tokens)
         return total_tokens
 
+    def _count_unknown(self, history: Iterable[Dict[str, str]], batch_tokenize_fn: BatchTokenizer) -> None:
+        token_counts = self._token_counts
+        unknown = [
+            entry for entry in history
+            if (known := token_counts.get(id(entry))) is None or known[0] is not entry
+        ]
+        if not unknown:
+            return
+        counts = batch_tokenize_fn([entry.get("content", "") for entry in unknown])
+        for entry, tokens in zip(unknown, counts):
+            token_counts[id(entry)] = (entry, tokens)
+
+    def _entry_tokens(self, entry: Dict[str, str], tokenize_fn: Any) -> int:
+        known = self._token_counts.get(id(entry))
+        if known is not None and known[0] is entry:
+            return known[1]
+        tokens: int = tokenize_fn(entry.get("content", ""))
+        self._token_counts[id(entry)] = (entry, tokens)
+        return tokens
+
 
 class PromptManager(ABC, Generic[H, E]):
+    logger: logging.Logger
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # one logger per class, instances only read it
+        cls.logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
+
     def __init__(self, initial_mode: Mode, reduction_strategy: Optional[ReductionStrategy]) -> None:
         if reduction_strategy is None:
             self.reduction_strategy: ReductionStrategy = RemoveOldestStrategy()
@@ -195,22 +432,28 @@ class PromptManager(ABC, Generic[H, E]):
             self.reduction_strategy = reduction_strategy
 
         self.current_mode: Mode = initial_mode
-        self.template: PromptTemplate = GLOBAL_BASE_TEMPLATES[initial_mode.name]
-        self.histories: Dict[Mode, List[Dict[str, str]]] = {mode: [] for mode in Mode}
+        self.template: PromptTemplate = GLOBAL_BASE_TEMPLATES[initial_mode]
+        # a mode gets its history when it is used first
+        self.histories: DefaultDict[Mode, Deque[Dict[str, str]]] = defaultdict(deque)
+        # token total of the turns of each mode's history, updated when entries are added or removed
+        self._token_totals: DefaultDict[Mode, int] = defaultdict(int)
+        # system entry of each mode, kept apart from the turns that the reduction strategy trims
+        self.system_messages: Dict[Mode, E] = {}
 
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.logger.info(
             "Initialized histories for modes: %s",
-            [mode.name for mode in self.histories.keys()]
+            [mode.name for mode in Mode]
         )
         self.logger.debug("Initial mode set to %s", self.current_mode.name)
 
     def set_mode(self, mode: Mode) -> None:
-        if mode not in self.histories:
-            self.logger.error("Attempted to set unsupported mode: %s", mode.name)
-            raise ValueError(f"Mode {mode.name} is not supported for history management.")
+        if mode is self.current_mode:
+            return
+        if not isinstance(mode, Mode):
+            self.logger.error("Attempted to set unsupported mode: %s", mode)
+            raise ValueError(f"Mode {mode} is not supported for history management.")
         self.current_mode = mode
-        self.template = GLOBAL_BASE_TEMPLATES[mode.name]
+        self.template = GLOBAL_BASE_TEMPLATES[mode]
         self.logger.info("Mode set to %s", self.current_mode.name)
 
     @abstractmethod
@@ -223,41 +466,133 @@ class PromptManager(ABC, Generic[H, E]):
 
     @abstractmethod
     def get_history(self) -> H:
+        """
+        The turns of the current mode, a deque that is modified in place by the manager. The
+        system entry is not part of it, it is kept in system_messages.
+        """
         pass
 
+    def get_history_for_llm(self) -> List[Dict[str, str]]:
+        """
+        The history of the current mode as a list of plain dicts, as the LLM clients send it.
+        """
+        return [dict(entry) for entry in self._entries_for_llm()]
+
+    def _entries_for_llm(self) -> Iterable[E]:
+        # the system entry lives outside the trimmed history and always goes first
+        history = self.histories[self.current_mode]
+        system_message = self.system_messages.get(self.current_mode)
+        if system_message is None:
+            return history
+        return chain((system_message,), history)
+
+    def _system_tokens(self) -> int:
+        system_message = self.system_messages.get(self.current_mode)
+        if system_message is None:
+            return 0
+        return self.count_tokens(system_message["content"])
+
+    def dump_history_json(self) -> bytes:
+        """
+        The history of the current mode serialized as a JSON array of role/content objects.
+        """
+        return orjson.dumps(self.get_history_for_llm())
+
     @abstractmethod
     def get_last_entry(self) -> Optional[E]:
         pass
 
-    @abstractmethod
     def add_user_entry(self, user_prompt: str) -> E:
-        pass
+        return self._add_entry("user", user_prompt)
 
-    @abstractmethod
     def add_assistant_entry(self, ai_response: str) -> E:
-        pass
+        return self._add_entry("assistant", ai_response)
+
+    def _add_entry(self, role: str, text: str) -> E:
+        entry: E = self._do_add_entry(role, text)
+        tokens: int = self.count_tokens(text)
+        self._token_totals[self.current_mode] += tokens
+        self.reduction_strategy.add(entry, tokens)
+        return entry
 
     @abstractmethod
-    def count_history_tokens(self) -> int:
+    def _do_add_entry(self, role: str, text: str) -> E:
+        """
+        Append an entry with role and text to the current history and return it. Called by
+        add_user_entry()/add_assistant_entry(), which keep the token totals up to date.
+        """
         pass
 
+    def count_history_tokens(self) -> int:
+        return self._token_totals[self.current_mode] + self._system_tokens()
+
+    def _recount_history(self, mode: Optional[Mode] = None) -> None:
+        """
+        Count the tokens of the turns of a history again, after they were replaced or entries
+        were removed. Defaults to the history of the current mode.
+        """
+        if mode is None:
+            mode = self.current_mode
+        contents = [entry["content"] for entry in self.histories[mode] if "content" in entry]
+        self._token_totals[mode] = sum(self.count_tokens_batch(contents))
+
     @abstractmethod
     def count_tokens(self, text: str) -> int:
+        """
+        Token count of text. The same prompts and turns are counted again and again, so
+        implementations should memoize the counts.
+        """
         pass
 
-    @abstractmethod
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        """
+        Token counts of several texts, subclasses may count them in one tokenizer call.
+        """
+        count = self.count_tokens
+        return [count(text) for text in texts]
+
     def reduce_history(self, token_limit: int) -> None:
-        pass
+        history = self.histories[self.current_mode]
+        # the system prompt is never removed, the turns have to fit into what it leaves of the limit
+        turn_limit = max(0, token_limit - self._system_tokens())
+        if not history or self._token_totals[self.current_mode] <= turn_limit:
+            return
+        self.reduction_strategy.reduce(history, self.count_tokens, turn_limit, self.count_tokens_batch)
+        self._recount_history()
 
     @abstractmethod
     def pretty_print_history(self) -> str:
         pass
 
-    def get_system_prompt(self, context_data: Optional[Dict[str, str]] = None) -> str:
-        system_prompt: str = self.template.format_prompt(context_data)
+    def get_system_prompt(self, context_data: Optional[Dict[str, str]] = None, mode: Optional[Mode] = None) -> str:
+        template: PromptTemplate = self.template if mode is None else GLOBAL_BASE_TEMPLATES[mode]
+        # the same template and context give the same prompt, it is rendered once
+        if context_data:
+            context = frozenset(_prompt_context(context_data).items())
+        else:
+            context = _DEFAULT_PROMPT_CONTEXT_KEY
+        system_prompt: str = _system_prompt_for(template, context)
         self.logger.debug("System prompt retrieved: %s", system_prompt)
         return system_prompt
 
+    def get_prompt_segments(
+        self,
+        context_data: Optional[Dict[str, str]] = None,
+        mode: Optional[Mode] = None,
+        timestamp: Optional[str] = None,
+    ) -> List[str]:
+        """
+        The system prompt as [static prompt, dynamic prompt, timestamp], ordered from the static to the
+        per-turn content. Concatenated in this order the static part is a cacheable prefix. The
+        timestamp defaults to get_timestamp().
+        """
+        template: PromptTemplate = self.template if mode is None else GLOBAL_BASE_TEMPLATES[mode]
+        segments: List[str] = [self.get_system_prompt(context_data, mode)]
+        dynamic: str = template.format_dynamic_prompt(_prompt_context(context_data))
+        if dynamic:
+            segments.append(dynamic)
+        segments.append(self.get_timestamp() if timestamp is None else timestamp)
+        return segments
+
     def get_timestamp(self) -> str:
-        now: datetime.datetime = datetime.datetime.now(datetime.timezone.utc)
-        return f"Es ist {now.strftime('%A')}, der {now.strftime('%d.%m.%Y')} um {now.strftime('%H:%M')} UTC. "
+        return _timestamp_for_minute(int(time.time()) // 60)
@@ -1,16 +1,92 @@
 import logging
+import os
+import threading
 import tiktoken
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
 from mate.services.llm.prompt_manager_interface import (
     PromptManager,
     Mode,
     RemoveOldestStrategy,
     ReductionStrategy,
     GLOBAL_BASE_TEMPLATES,
+    HistoryEntry,
+    _WEEKDAYS,
 )
 import datetime
 
-class LlamaPromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
+# at least this many uncached texts are counted with one tiktoken batch call
+_BATCH_MIN_TEXTS = 16
+# tiktoken releases the GIL in encode_batch, the texts are encoded by this many threads at most
+_BATCH_THREADS = min(8, os.cpu_count() or 1)
+
+_ENCODING_NAME = "cl100k_base"
+
+_ROLE_LABELS = {"user": "User", "assistant": "Assistant", "system": "System"}
+
+
+@lru_cache(maxsize=None)
+def _enc(enc_name: str) -> tiktoken.Encoding:
+    # loaded on first use, tiktoken downloads the BPE ranks if they are not cached yet
+    return tiktoken.get_encoding(enc_name)
+
+
+# token counts by (encoding name, text), shared by all managers so system prompts and common
+# turns are counted only once per process. Least recently used first, guarded by the lock
+_TOKEN_COUNTS: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+_TOKEN_COUNTS_MAX = 8192
+_TOKEN_COUNTS_LOCK = threading.Lock()
+# texts longer than this are not kept in the token count cache
+_TOKEN_CACHE_MAX_CHARS = 8192
+
+
+def _cached_len(key: Tuple[str, str]) -> Optional[int]:
+    with _TOKEN_COUNTS_LOCK:
+        tokens = _TOKEN_COUNTS.get(key)
+        if tokens is not None:
+            _TOKEN_COUNTS.move_to_end(key)
+        return tokens
+
+
+def _store_len(key: Tuple[str, str], tokens: int) -> None:
+    with _TOKEN_COUNTS_LOCK:
+        _TOKEN_COUNTS[key] = tokens
+        if len(_TOKEN_COUNTS) > _TOKEN_COUNTS_MAX:
+            _TOKEN_COUNTS.popitem(last=False)
+
+
+def _encode_len(encoding: tiktoken.Encoding, text: str) -> int:
+    if len(text) > _TOKEN_CACHE_MAX_CHARS:
+        return len(encoding.encode(text))
+    key = (encoding.name, text)
+    tokens = _cached_len(key)
+    if tokens is None:
+        tokens = len(encoding.encode(text))
+        _store_len(key, tokens)
+    return tokens
+
+
+def _encode_len_batch(encoding: tiktoken.Encoding, texts: Sequence[str]) -> List[int]:
+    # cached counts are reused, the rest is encoded in one tiktoken call when there are enough of them
+    counts: List[Optional[int]] = [
+        _cached_len((encoding.name, text)) if len(text) <= _TOKEN_CACHE_MAX_CHARS else None for text in texts
+    ]
+    missing = [i for i, tokens in enumerate(counts) if tokens is None]
+    if len(missing) < _BATCH_MIN_TEXTS:
+        for i in missing:
+            counts[i] = _encode_len(encoding, texts[i])
+        return counts
+    num_threads = min(_BATCH_THREADS, len(missing))
+    encoded = encoding.encode_batch([texts[i] for i in missing], num_threads=num_threads)
+    for i, tokens in zip(missing, encoded):
+        counts[i] = len(tokens)
+        if len(texts[i]) <= _TOKEN_CACHE_MAX_CHARS:
+            _store_len((encoding.name, texts[i]), len(tokens))
+    return counts
+
+
+class LlamaPromptManager(PromptManager[Deque[HistoryEntry], HistoryEntry]):
     """
     Concrete implementation of PromptManager for Llama 3.3.
     Manages separate histories for each mode and utilizes tiktoken for tokenization.
@@ -18,17 +94,12 @@ class LlamaPromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
 
     def __init__(self, initial_mode: Mode, reduction_strategy: ReductionStrategy) -> None:
         super().__init__(initial_mode, reduction_strategy)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        try:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
-            self.logger.info("LlamaPromptManager initialized with encoding 'cl100k_base'.")
-        except Exception as e:
-            self.logger.error("Failed to initialize tokenizer: %s", e)
-            raise
+        # all managers share one encoding instance
+        self.encoding = _enc(_ENCODING_NAME)
 
         for mode in Mode:
-            # init the system prompt
-            self.empty_history()
+            # init the system prompt of every mode
+            self._reset_history_for(mode)
 
     def set_history(self, history: List[Dict[str, str]]) -> None:
         if not isinstance(history, list):
@@ -46,54 +117,55 @@ class LlamaPromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
                 self.logger.error("The 'role' must be either 'user', 'assistant', or 'system'.")
                 raise ValueError("The 'role' must be either 'user', 'assistant', or 'system'.")
 
-        self.get_history().clear()
-        self.get_history().extend(history)
+        if history and history[0]["role"] == "system":
+            # a leading system entry replaces the system prompt of the mode, it is not a turn
+            self.system_messages[self.current_mode] = HistoryEntry("system", history[0]["content"])
+            history = history[1:]
+        entries = self.get_history()
+        entries.clear()
+        entries.extend(HistoryEntry(entry["role"], entry["content"]) for entry in history)
+        self._recount_history()
         self.logger.info("History set for mode %s", self.current_mode.name)
 
-    def empty_history(self) -> None:
-        self.get_history().clear()
-        primer = f"Heute ist {['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag', 'Freitag', 'Samstag', 'Sonntag'][datetime.datetime.now().weekday()]} der {datetime.datetime.now().strftime('%d.%m.%Y')}. Du befindest dich in Deutschland"
+    def empty_history(self, mode: Optional[Mode] = None) -> None:
+        self._reset_history_for(self.current_mode if mode is None else mode)
 
-        self.get_history().append(
-            {
-                "role": "system",
-                "content": f"{primer}. " + GLOBAL_BASE_TEMPLATES[self.current_mode.name].system_prompt,
-            }
-        )
-        self.logger.info("History emptied for mode %s", self.current_mode.name)
+    def _reset_history_for(self, mode: Mode) -> None:
+        history = self.histories[mode]
+        history.clear()
+        now = datetime.datetime.now()
+        primer = f"Heute ist {_WEEKDAYS[now.weekday()]} der {now:%d.%m.%Y}. Du befindest dich in Deutschland"
+
+        # static instructions first and the date last, the prompt prefix then stays the same every day
+        segments = self.get_prompt_segments(mode=mode, timestamp=f"{primer}.")
+        self.system_messages[mode] = HistoryEntry(role="system", content="\n\n".join(segments))
+        self._recount_history(mode)
+        self.logger.info("History emptied for mode %s", mode.name)
 
-    def get_history(self) -> List[Dict[str, str]]:
-        self.logger.debug("Retrieving history for mode %s", self.current_mode.name)
+    def get_history(self) -> Deque[HistoryEntry]:
         return self.histories[self.current_mode]
 
-    def get_last_entry(self) -> Optional[Dict[str, str]]:
+    def get_last_entry(self) -> Optional[HistoryEntry]:
         history = self.get_history()
         if not history:
             self.logger.debug("No entries found in history for mode %s", self.current_mode.name)
             return None
         last_entry = history[-1]
-        self.logger.debug("Last entry for mode %s: %s", self.current_mode.name, last_entry)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Last entry for mode %s: %s", self.current_mode.name, last_entry)
         return last_entry
 
-    def add_user_entry(self, user_prompt: str) -> Dict[str, str]:
-        entry = {"content": user_prompt, "role": "user"}
-        self.get_history().append(entry)
-        self.logger.info("Added user entry to %s: %s", self.current_mode.name, user_prompt)
-        return entry
+    def get_history_for_llm(self) -> List[Dict[str, str]]:
+        return [entry.to_openai_dict() for entry in self._entries_for_llm()]
 
-    def add_assistant_entry(self, ai_response: str) -> Dict[str, str]:
-        entry = {"content": ai_response, "role": "assistant"}
+    def _do_add_entry(self, role: str, text: str) -> HistoryEntry:
+        entry = HistoryEntry(role, text)
         self.get_history().append(entry)
-        self.logger.info("Added AI entry to %s: %s", self.current_mode.name, ai_response)
+        self.logger.info("Added %s entry to %s: %s", role, self.current_mode.name, text)
         return entry
 
     def count_history_tokens(self) -> int:
-        total_tokens = 0
-        for entry in self.get_history():
-            content = entry.get("content", "")
-            tokens = self.count_tokens(content)
-            total_tokens += tokens
-            self.logger.debug("Entry content: '%s' has %d tokens", content, tokens)
+        total_tokens = super().count_history_tokens()
         self.logger.info(
             "Total tokens in history for mode %s: %d",
             self.current_mode.name,
@@ -103,15 +175,17 @@ class LlamaPromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
 
     def count_tokens(self, text: str) -> int:
         try:
-            tokens = self.encoding.encode(text)
-            token_count = len(tokens)
-            self.logger.debug("Tokenized text: '%s' into %d tokens", text, token_count)
-            return token_count
+            return _encode_len(self.encoding, text)
         except Exception as e:
             self.logger.error("Tokenization failed for text: '%s'. Error: %s", text, e)
             raise
 
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        return _encode_len_batch(self.encoding, texts)
+
     def reduce_history(self, token_limit: int) -> None:
+        if not self.get_history():
+            return
         self.logger.info(
             "Ensuring token limit for mode %s: %d tokens",
             self.current_mode.name,
@@ -124,20 +198,18 @@ class LlamaPromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
                 current_token_count,
                 token_limit,
             )
-            self.reduction_strategy.reduce(self.get_history(), self.count_tokens, token_limit)
+            super().reduce_history(token_limit)
             if self.count_history_tokens() > token_limit:
                 self.logger.warning("Unable to reduce history within the token limit.")
 
     def pretty_print_history(self) -> str:
-        formatted_history = []
-        for entry in self.get_history():
-            role = entry.get("role", "unknown").capitalize()
-            content = entry.get("content", "")
-            formatted_history.append(f"{role}: {content}")
-        history_str = "\n".join(formatted_history)
-        self.logger.debug(
-            "Formatted history for mode %s:\n%s",
-            self.current_mode.name,
-            history_str,
+        history_str = "\n".join(
+            f"{_ROLE_LABELS.get(entry.role, 'Unknown')}: {entry.content}" for entry in self._entries_for_llm()
         )
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Formatted history for mode %s:\n%s",
+                self.current_mode.name,
+                history_str,
+            )
         return history_str
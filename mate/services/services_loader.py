@@ -1,7 +1,8 @@
-import asyncio
+import os
 
 import yaml
-from typing import Dict, Any, List, Type
+from functools import lru_cache
+from typing import Dict, Any, List, Type, Tuple, Union
 import importlib
 
 from mate.services import BaseService
@@ -13,29 +14,72 @@ import json
 
 logger = logging.getLogger(f"{__name__}.service_loader")
 
+# the libyaml based loader if PyYAML was built with it, otherwise the pure python one
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# service classes created from a yaml file, keyed by (path, modification time)
+_service_classes_cache: Dict[Tuple[str, float], List[BaseService]] = {}
+
+# service classes created by create_dynamic_class, keyed by (base class, class name, config items)
+_dynamic_classes: Dict[Tuple[Type, str, Tuple[Tuple[str, Any], ...]], Type] = {}
+
 # Helper to dynamically import a class
+@lru_cache(maxsize=None)
 def import_class_from_path(path: str) -> Type:
+    # service classes register themselves in BaseService._registry when their module is imported
+    service_class = BaseService._registry.get(path)
+    if service_class is not None:
+        return service_class
     module_path, class_name = path.rsplit('.', 1)
     module = importlib.import_module(module_path)
+    service_class = BaseService._registry.get(path)
+    if service_class is not None:
+        return service_class
     return getattr(module, class_name)
 
 # Dynamically creates a subclass with a custom class name and constructor
 def create_dynamic_class(class_name: str, base_class: Type, config: Dict[str, Any]) -> Type:
+    # the same yaml entry gives the same class, e.g. when the file was touched but the entry is unchanged
+    try:
+        key = (base_class, class_name, tuple(sorted(config.items())))
+        cached = _dynamic_classes.get(key)
+    except TypeError:
+        # unhashable config values, e.g. lists, are not cached
+        key, cached = None, None
+    if cached is not None:
+        return cached
+
     def __init__(self_self):
         #logger.debug(f"Dynamic class constructor: {config}")
         super(new_class, self_self).__init__(**config)
 
     new_class = type(class_name, (base_class,), {
+        "__module__": __name__,
+        # no per-instance __dict__ for the slotted service classes
+        "__slots__": (),
         "__init__": __init__,
         "config": config
     })
+    if key is not None:
+        _dynamic_classes[key] = new_class
     # return the blueprint to create the class (constructor is not called yet)
     return new_class
 
 
-async def create_instances_by_key(yaml_path: str, key: str) -> List[BaseService]:
-    with open(yaml_path, "r") as f:
-        yaml_data = yaml.safe_load(f)
+@lru_cache(maxsize=None)
+def _load_yaml(path: str, mtime: float) -> Dict[str, Any]:
+    # cached per modification time, an edited file is parsed again. Callers must not modify the result
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=_YamlLoader) or {}
+
+
+def load_services_yaml(yaml_path: str) -> Dict[str, Any]:
+    return _load_yaml(os.path.abspath(yaml_path), os.path.getmtime(yaml_path))
+
+
+def create_instances_by_key(yaml_source: Union[str, Dict[str, Any]], key: str) -> List[BaseService]:
+    # a path is loaded here, a dict is used as already parsed
+    yaml_data = load_services_yaml(yaml_source) if isinstance(yaml_source, str) else yaml_source
 
     # Use dictionary lookup since yaml_data is a dict
     section = yaml_data.get(key, [])
@@ -44,32 +88,39 @@ async def create_instances_by_key(yaml_path: str, key: str) -> List[BaseService]
     for entry in section:
         # Process each entry from the section to create your instance.
         class_name = entry.get("name")
-        # get and remove base_class name (is not a constructor parameter)
-        base_class_path = entry.pop("base_class")
-        base_class = import_class_from_path(base_class_path)
-        logger.debug(f"create {key} service instance: {class_name}:\n## Class: {base_class.__name__} ##\n{json.dumps(entry, indent=4, sort_keys=True)}")
-        instance = create_dynamic_class(class_name, base_class, entry)
+        # base_class name is not a constructor parameter, the parsed entry itself stays untouched
+        base_class = import_class_from_path(entry["base_class"])
+        config = {k: v for k, v in entry.items() if k != "base_class"}
+        logger.debug(f"create {key} service instance: {class_name}:\n## Class: {base_class.__name__} ##\n{json.dumps(config, indent=4, sort_keys=True)}")
+        instance = create_dynamic_class(class_name, base_class, config)
         instances.append(instance)  # Replace with actual instance creation
     return instances
 
 # Individual service creation functions
-async def create_ollama_llm_instances(yaml_path: str = "remote_services.yml") -> List[LlmInterface]:
-    return await create_instances_by_key(yaml_path=yaml_path, key="LLM")
+def create_ollama_llm_instances(yaml_path: Union[str, Dict[str, Any]] = "remote_services.yml") -> List[LlmInterface]:
+    return create_instances_by_key(yaml_path, key="LLM")
 
-async def create_openrouter_openai_instances(yaml_path: str = "remote_services.yml") -> List[LlmInterface]:
-    return await create_instances_by_key(yaml_path=yaml_path, key="LLM")
+def create_openrouter_openai_instances(yaml_path: Union[str, Dict[str, Any]] = "remote_services.yml") -> List[LlmInterface]:
+    return create_instances_by_key(yaml_path, key="LLM")
 
-async def create_stt_instances(yaml_path: str = "remote_services.yml") -> List[STTInterface]:
-    return await create_instances_by_key(yaml_path=yaml_path, key="STT")
+def create_stt_instances(yaml_path: Union[str, Dict[str, Any]] = "remote_services.yml") -> List[STTInterface]:
+    return create_instances_by_key(yaml_path, key="STT")
 
-async def create_tts_instances(yaml_path: str = "remote_services.yml") -> List[TTSInterface]:
-    return await create_instances_by_key(yaml_path=yaml_path, key="TTS")
+def create_tts_instances(yaml_path: Union[str, Dict[str, Any]] = "remote_services.yml") -> List[TTSInterface]:
+    return create_instances_by_key(yaml_path, key="TTS")
 
 async def create_service_instances(yaml_path: str = "remote_services.yml") -> List[BaseService]:
-    llm_ollama_instances, llm_openrouter_instances, stt_instance, tts_instance = await asyncio.gather(
-        create_ollama_llm_instances(yaml_path=yaml_path),
-        create_openrouter_openai_instances(yaml_path=yaml_path),
-        create_stt_instances(yaml_path=yaml_path),
-        create_tts_instances(yaml_path=yaml_path)
-    )
-    return llm_ollama_instances + llm_openrouter_instances + stt_instance + tts_instance
\ No newline at end of file
+    cache_key = (os.path.abspath(yaml_path), os.path.getmtime(yaml_path))
+    cached = _service_classes_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Reuse {len(cached)} service definitions from {yaml_path}")
+        return list(cached)
+    # the file is parsed once, all creators read the same dict
+    yaml_data = _load_yaml(*cache_key)
+    llm_ollama_instances = create_ollama_llm_instances(yaml_data)
+    llm_openrouter_instances = create_openrouter_openai_instances(yaml_data)
+    stt_instance = create_stt_instances(yaml_data)
+    tts_instance = create_tts_instances(yaml_data)
+    instances = llm_ollama_instances + llm_openrouter_instances + stt_instance + tts_instance
+    _service_classes_cache[cache_key] = instances
+    return list(instances)
@@ -6,9 +6,10 @@ from mate.services import BaseService
 
 
 class STTInterface(BaseService, metaclass=ABCMeta):
+    service_type = "STT"
 
     def __init__(self, name: str, priority: int):
-        super().__init__(name, "STT", priority)
+        super().__init__(name, priority)
         self.stt_endpoint = os.getenv('STT_ENDPOINT', 'http://127.0.0.1:8000/v1/audio/transcriptions')
 
     @abstractmethod
@@ -1,15 +1,12 @@
 import json
+import re
 import time
-from typing import Callable, AsyncGenerator, Optional, Any
-import websocket
-import threading
+from typing import Callable, AsyncGenerator, Optional
 import asyncio
-import logging
-from urllib.parse import urlparse
-from queue import Queue
+
+import aiohttp
 
 from mate.services.stt.stt_interface import STTInterface
-from websocket import WebSocket, WebSocketApp, ABNF
 
 
 dataset_bias = [
@@ -46,132 +43,115 @@ dataset_bias = [
     "Das war's."
 ]
 
+# all phrases in one pattern, longer phrases first so they win over the phrases they contain
+_DATASET_BIAS_RE = re.compile("|".join(re.escape(txt) for txt in sorted(dataset_bias, key=len, reverse=True)))
+
 
 class STTWhisperRemote(STTInterface):
     def __init__(self, name: str, priority: int, endpoint: str) -> None:
         super().__init__(name=name, priority=priority)
-        self.logger: logging.Logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.stt_endpoint: str = endpoint
         self.ws_url: str = self.stt_endpoint.replace("http://", "ws://")
-        websocket.enableTrace(False)
         self.store_wav: bool = False
+        # websocket session of the instance, created on first use and kept alive between transcriptions
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def config_endpoint(cls) -> Optional[str]:
+        # the service classes created from remote_services.yml carry their entry in cls.config
+        return getattr(cls, "config", {}).get("endpoint")
 
     async def check_availability(self) -> bool:
         return await self.__check_remote_endpoint__(self.stt_endpoint)
 
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _clean_transcription(self, message: str) -> Optional[str]:
+        """
+        Text of a transcription message without the known Whisper hallucinations, or None
+        if nothing useful is left.
+        """
+        try:
+            result = json.loads(message)
+        except json.JSONDecodeError:
+            self.logger.warning("Got non-JSON message: %s", message)
+            return None
+        if "text" not in result or not result["text"].strip():
+            return None
+        res_txt: str = result["text"].strip().replace("  ", " ")
+        res_txt = _DATASET_BIAS_RE.sub("", res_txt).strip()
+        if len(res_txt) > 8:
+            return res_txt
+        return None
+
+    async def _send_audio_chunks(self, ws: aiohttp.ClientWebSocketResponse, audio_stream: AsyncGenerator[bytes, None]) -> None:
+        start_time_sending: float = time.time()
+        try:
+            async for wav_chunk in audio_stream:
+                await ws.send_bytes(wav_chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error("Error in send_audio_chunks: %s", e)
+        finally:
+            self.logger.debug(
+                "Sent data to websocket for %f seconds. Closing the websocket.",
+                time.time() - start_time_sending,
+            )
+            # closing ends the receive loop in transcribe_stream
+            await ws.close()
+
     async def transcribe_stream(
         self,
         audio_stream: AsyncGenerator[bytes, None],
         websocket_on_close: Callable[[], None],
         websocket_on_open: Callable[[], None],
     ) -> AsyncGenerator[str, None]:
-        queue_data: Queue[Optional[str]] = Queue()
-
-        def on_message(wsc: WebSocket, message: str) -> None:
-            try:
-                result = json.loads(message)
-                if "text" in result and result["text"].strip():
-                    res_txt: str = result["text"].strip().replace("  ", " ")
-                    for txt in dataset_bias:
-                        if txt in res_txt:
-                            res_txt = res_txt.replace(txt, "")
-                    if len(res_txt.strip()) > 8:
-                        queue_data.put(res_txt.strip())
-            except json.JSONDecodeError:
-                self.logger.warning("Got non-JSON message: %s", message)
-
-        thread_stop_event: threading.Event = threading.Event()
-
-        def on_open(wsc2: WebSocket) -> None:
-            self.logger.info("Successfully connected websocket %s", self.ws_url)
-            websocket_on_open()
-
-            def send_audio_chunks() -> None:
-                try:
-                    start_time_sending: float = time.time()
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-
-                    async def send_chunks() -> None:
-                        async for wav_chunk in audio_stream:
-                            if thread_stop_event.is_set():
-                                loop.stop()
-                                break
-                            wsc2.send(wav_chunk, opcode=ABNF.OPCODE_BINARY)
-
-                    loop.run_until_complete(send_chunks())
-                except KeyboardInterrupt:
-                    websocket_on_close()
-                    thread_stop_event.set()
-                    raise
-                except BaseException as e:
-                    self.logger.error("Error in send_audio_chunks: %s", e)
-                    websocket_on_close()
-                    thread_stop_event.set()
-                finally:
-                    self.logger.debug(
-                        "Sent data to websocket for %f seconds. Cleaning up thread and ws resources.",
-                        time.time() - start_time_sending,
-                    )
-                    try:
-                        wsc2.close()
-                    except Exception:
-                        pass
-                    if loop.is_running():
-                        loop.stop()
-                    if not loop.is_closed():
-                        loop.close()
-                    thread_stop_event.set()
-
-            threading.Thread(target=send_audio_chunks, daemon=True).start()
-
-        def on_error(ws_obj: WebSocket, code: str) -> None:
-            self.logger.error("WebSocket error: %s", code)
-            websocket_on_close()
-            thread_stop_event.set()
-
-        def on_close(ws_obj: WebSocket, i1: Any, i2: Any) -> None:
-            self.logger.info("WebSocket closed: %s, %s", i1, i2)
-            queue_data.put(None)
-            websocket_on_close()
-            thread_stop_event.set()
-
-        ws: Optional[WebSocketApp] = None
+        # sending and receiving both run on the caller's event loop, no extra threads or loops
+        session = await self._get_session()
+        sender: Optional[asyncio.Task] = None
         try:
             self.logger.debug("Starting websocket connection to %s", self.ws_url)
-            ws = WebSocketApp(
-                self.ws_url,
-                on_open=on_open,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close,
-            )
-            ws_thread = threading.Thread(target=ws.run_forever, daemon=True)
-            ws_thread.start()
-
-            old_full_text: str = ""
-            while not thread_stop_event.is_set():
-                t: Optional[str] = queue_data.get()
-                if t is None:
-                    break
-                t_diff: str = t[len(old_full_text) :]
-                old_full_text = t
-                self.logger.info("got: %s", t_diff)
-                yield t_diff
-
-            ws_thread.join()
-            self.logger.debug("Transcription queue closed")
+            async with session.ws_connect(self.ws_url) as ws:
+                self.logger.info("Successfully connected websocket %s", self.ws_url)
+                websocket_on_open()
+                sender = asyncio.create_task(self._send_audio_chunks(ws, audio_stream))
+
+                old_full_text: str = ""
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        t = self._clean_transcription(msg.data)
+                        if t is None:
+                            continue
+                        t_diff: str = t[len(old_full_text):]
+                        old_full_text = t
+                        self.logger.info("got: %s", t_diff)
+                        yield t_diff
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        self.logger.error("WebSocket error: %s", ws.exception())
+                        break
+                self.logger.info("WebSocket closed: %s", ws.close_code)
+            self.logger.debug("Transcription stream closed")
         except KeyboardInterrupt as e:
             self.logger.info("Got KeyboarInterrupt")
             raise e
-        except BaseException as e:
+        except Exception as e:
             self.logger.error("Error: %s, type=%s", e, type(e))
-            thread_stop_event.set()
-            if ws:
-                ws.close()
-            if ws_thread and ws_thread.is_alive():
-                ws_thread.join(timeout=5)
         finally:
+            if sender is not None and not sender.done():
+                sender.cancel()
+                await asyncio.gather(sender, return_exceptions=True)
+            websocket_on_close()
             self.logger.debug("Cleanup completed")
 
     def config_str(self) -> str:
@@ -3,16 +3,23 @@ import threading
 import queue
 import logging
 import abc
+import numpy as np
 from mate.services import BaseService
-from typing import TypeVar, Type
+from typing import TypeVar, Type, Iterator
 from mate.audio.soundcard_pyaudio import SoundCard
+from mate.audio.stream_resampler import StreamResampler
+
+# audio that is buffered before the playback of a streamed sentence starts
+STREAM_BUFFER_MS = int(os.getenv('TTS_STREAM_BUFFER_MS', '150'))
 
 
 class TTSInterface(BaseService, metaclass=abc.ABCMeta):
+    service_type = "TTS"
 
     def __init__(self, name: str, priority: int):
-        super().__init__(name, "TTS", priority)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        super().__init__(name, priority)
+        # sample rate of the PCM yielded by stream_sentence
+        self.stream_sample_rate: int = 24000
         self.tts_endpoint = os.getenv('TTS_ENDPOINT', 'http://127.0.0.1:8001/v1')
         self._sentence_queue = queue.Queue()
         self.stop_signal = threading.Event()
@@ -41,6 +48,50 @@ class TTSInterface(BaseService, metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def stream_sentence(self, sentence: str) -> Iterator[bytes]:
+        """
+        Yield the sentence as raw 16 bit mono PCM (at stream_sample_rate) while it is
+        still rendered.
+        """
+        pass
+
+    def speak_sentence_streaming(self, sentence: str) -> bool:
+        """
+        Play the sentence while the backend is still rendering it. Playback starts as soon
+        as STREAM_BUFFER_MS of audio arrived instead of waiting for the whole sentence.
+        Returns False when the playback has been interrupted by the stop signal.
+        """
+        in_rate = self.stream_sample_rate
+        out_rate = self.soundcard.sample_rate
+        min_bytes = in_rate * 2 * STREAM_BUFFER_MS // 1000
+        pending = bytearray()
+        # one resampler for the whole sentence, it carries the filter state across the chunks
+        resampler = StreamResampler(in_rate, out_rate) if in_rate != out_rate else None
+
+        def play(data: bytes, last: bool) -> None:
+            samples = np.frombuffer(data, dtype=np.int16)
+            if resampler is not None:
+                resampled = resampler.process(samples)
+                if last:
+                    resampled = np.concatenate((resampled, resampler.flush()))
+                samples = resampled.clip(-32768, 32767).astype(np.int16)
+            self.soundcard.play_audio(out_rate, samples, append_silence=last)
+
+        for chunk in self.stream_sentence(sentence):
+            if self.stop_signal.is_set():
+                return False
+            pending.extend(chunk)
+            if len(pending) >= min_bytes:
+                # only hand over complete 16 bit samples
+                cut = len(pending) - len(pending) % 2
+                play(bytes(pending[:cut]), last=False)
+                del pending[:cut]
+        if self.stop_signal.is_set():
+            return False
+        play(bytes(pending[:len(pending) - len(pending) % 2]), last=True)
+        return True
+
     def _run(self):
         """
         Background thread continuously pulls sentences from the queue and speaks them.
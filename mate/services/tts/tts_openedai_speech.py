@@ -1,9 +1,8 @@
 import openai
-import logging
 from mate.services.tts.tts_interface import TTSInterface
 from io import BytesIO
-import soundfile as sf
 from urllib.parse import urlparse
+from typing import Iterator, Optional
 import asyncio
 
 class TTSOpenedAISpeech(TTSInterface):
@@ -15,10 +14,10 @@ class TTSOpenedAISpeech(TTSInterface):
     def config_str(self) -> str:
         pass
 
-    def __init__(self, name: str, priority: int, endpoint: str, voice: str):
+    def __init__(self, name: str, priority: int, endpoint: str, voice: str, stream_sample_rate: int = 24000):
         super().__init__(name=name, priority=priority)
+        self.stream_sample_rate = stream_sample_rate
         self.tts_endpoint = endpoint
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.client = openai.OpenAI(
             # Set environment variables for API configuration
             api_key="sk-111111111",
@@ -26,26 +25,31 @@ class TTSOpenedAISpeech(TTSInterface):
         )
         self.voice = voice
 
+    @classmethod
+    def config_endpoint(cls) -> Optional[str]:
+        # the service classes created from remote_services.yml carry their entry in cls.config
+        return getattr(cls, "config", {}).get("endpoint")
+
     async def check_availability(self) -> bool:
         return await self.__check_remote_endpoint__(self.tts_endpoint)
 
     def speak_sentence(self, sentence: str):
-        # Launch a thread to handle speech synthesis and playback
-        # Generate speech using OpenAI's API
-        response = self.client.audio.speech.create(
+        # Play the audio while it is generated instead of waiting for the full response
+        self.speak_sentence_streaming(sentence)
+
+    def stream_sentence(self, sentence: str) -> Iterator[bytes]:
+        # Request raw PCM so chunks can be played without decoding
+        with self.client.audio.speech.with_streaming_response.create(
             model="tts-1",
             voice="thorsten-low",
             #voice="thorsten-medium",
             #voice="thorsten-medium-emo",
-            response_format="wav",
+            response_format="pcm",
             speed="1.0",
             input=sentence,
-        )
-        audio_stream = BytesIO(response.content)  # Use response.content to access binary audio data
-        audio_stream.seek(0)  # Reset the buffer pointer to the start
-        # Decode MP3 to WAV in-memory
-        data, sample_rate = sf.read(audio_stream, dtype='float32')
-        self.soundcard.play_audio(sample_rate, data)
+        ) as response:
+            for chunk in response.iter_bytes(chunk_size=4096):
+                yield chunk
 
     def render_sentence(self, sentence: str, store_file_name: str, output_format: str = 'mp3'):
         if output_format not in ["mp3", "wav"]:
@@ -10,16 +10,16 @@ import asyncio
 import logging
 import re
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from nltk import sent_tokenize
 
 from mate.audio.soundcard_pyaudio import SoundCard
 from mate.human_speech_agent import HumanSpeechAgent
-from mate.services import ServiceDiscovery
+from mate.services import get_service_discovery
 
 from mate.services.llm.llm_interface import LlmInterface
-from mate.services.llm.prompt_manager_interface import Mode, RemoveOldestStrategy
+from mate.services.llm.prompt_manager_interface import Mode, PromptManager, RemoveOldestStrategy
 from mate.services.tts.tts_interface import TTSInterface
 from mate.utils import clean_str_from_markdown, is_sane_input_german
 
@@ -58,8 +58,15 @@ class SteamdeckMate:
         self.service_discovery = None
         self.human_speech_agent = None
         self.status = Mode.CHAT
-        self.prompt_manager = LlamaPromptManager(initial_mode=Mode.CHAT,
-                                            reduction_strategy=RemoveOldestStrategy())
+        # built on the first user input, see the prompt_manager property
+        self._prompt_manager: Optional[PromptManager] = None
+
+    @property
+    def prompt_manager(self) -> PromptManager:
+        if self._prompt_manager is None:
+            self._prompt_manager = LlamaPromptManager(initial_mode=Mode.CHAT,
+                                                      reduction_strategy=RemoveOldestStrategy())
+        return self._prompt_manager
 
     async def __aenter__(self):
         self.logger.info("Enter class")
@@ -77,9 +84,9 @@ class SteamdeckMate:
         self.logger.info("Reading remote_services.yml with service definitions")
         remote_services = await create_service_instances(yaml_path="remote_services.yml")
         self.logger.info(f"Created {len(remote_services)} services from remote_services.yml config")
-        self.service_discovery = ServiceDiscovery(service_definitions=remote_services)
+        self.service_discovery = get_service_discovery(service_definitions=remote_services)
         await self.service_discovery.start()
-        self.human_speech_agent = HumanSpeechAgent(service_discovery=self.service_discovery)
+        self.human_speech_agent = HumanSpeechAgent.instance(service_discovery=self.service_discovery)
         warmup_task = asyncio.create_task(self.human_speech_agent.warmup_cache())
         await self.service_discovery.print_status_table()
         self.logger.info("Starting to listen...")
@@ -133,7 +140,7 @@ class SteamdeckMate:
         response = ""
         sentence_buffer = ""
         # send to LLM and stream response
-        async for chunk in llm_provider.chat(self.prompt_manager.get_history()):
+        async for chunk in llm_provider.chat(self.prompt_manager.get_history_for_llm()):
             # clean out markdown
             chunk = clean_str_from_markdown(chunk)
             # append to response
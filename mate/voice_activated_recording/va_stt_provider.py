@@ -3,7 +3,7 @@ import asyncio
 import webrtcvad
 from typing import Optional, AsyncGenerator
 
-from mate.services import ServiceDiscovery
+from mate.services import ServiceDiscovery, get_service_discovery
 from mate.voice_activated_recording.va_interface import VoiceActivationInterface
 
 
@@ -21,7 +21,7 @@ class SttProviderWakeWord(VoiceActivationInterface):
     def __init__(self) -> None:
         super().__init__()
         self.logger: logging.Logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self.service_discovery: ServiceDiscovery = ServiceDiscovery()
+        self.service_discovery: ServiceDiscovery = get_service_discovery()
         self.vad: webrtcvad.Vad = webrtcvad.Vad(mode=3)  # Very aggressive mode
 
         # Typically, your soundcard should produce 16-bit, 1-channel, 16kHz audio.
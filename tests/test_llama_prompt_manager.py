@@ -13,8 +13,8 @@ class TestLlamaPromptManager(unittest.TestCase):
         self.manager = LlamaPromptManager(initial_mode=Mode.CHAT, reduction_strategy=RemoveOldestStrategy())
 
     def test_initial_system_prompt_in_history(self):
-        # Each mode's history is initialized with a system prompt
-        hist = self.manager.get_history()
+        # Each mode is initialized with a system prompt, sent ahead of the history
+        hist = self.manager.get_history_for_llm()
         self.assertTrue(len(hist) > 0, "History should have at least one entry (system prompt).")
         first_entry = hist[0]
         self.assertEqual(first_entry['role'], 'system', "The first entry should be a system message.")
@@ -23,7 +23,7 @@ class TestLlamaPromptManager(unittest.TestCase):
     def test_mode_switch_and_system_prompt(self):
         # Switch from CHAT to LEDCONTROL and see if the correct system prompt is loaded
         self.manager.set_mode(Mode.LEDCONTROL)
-        hist = self.manager.get_history()
+        hist = self.manager.get_history_for_llm()
         self.assertTrue(len(hist) > 0, "LEDCONTROL history should not be empty.")
         system_entry = hist[0]
         self.assertEqual(system_entry['role'], 'system')
@@ -53,11 +53,18 @@ class TestLlamaPromptManager(unittest.TestCase):
         for i in range(10):
             self.manager.add_user_entry("Some very long text " + ("x"*50))
 
-        # Now reduce
-        self.manager.reduce_history(token_limit=50)  # artificially small
+        # Now reduce, the system prompt always stays and counts against the limit
+        system_tokens = self.manager.count_history_tokens() - sum(
+            self.manager.count_tokens(entry["content"]) for entry in self.manager.get_history()
+        )
+        token_limit = system_tokens + 50  # artificially small
+        self.manager.reduce_history(token_limit=token_limit)
 
         total_tokens = self.manager.count_history_tokens()
-        self.assertTrue(total_tokens <= 50, f"Expected the history to be reduced to <= 50 tokens, got {total_tokens}.")
+        self.assertTrue(total_tokens <= token_limit, f"Expected the history to be reduced to <= {token_limit} tokens, got {total_tokens}.")
+        self.assertEqual(self.manager.get_history_for_llm()[0]["role"], "system")
+        sent_tokens = sum(self.manager.count_tokens(entry["content"]) for entry in self.manager.get_history_for_llm())
+        self.assertEqual(sent_tokens, total_tokens)
 
     def test_pretty_print_history(self):
         # Check that we get a well-formatted string of roles and contents
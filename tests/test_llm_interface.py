@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+import unittest
+from unittest.mock import patch
+
+from mate.services.llm import llm_interface
+from mate.services.llm.llm_interface import LlmInterface
+
+
+class FakeLlm(LlmInterface):
+
+    def __init__(self):
+        super().__init__("FakeLlm", 1)
+
+    async def _probe_availability(self) -> bool:
+        return True
+
+    async def chat(self, full_chat, immediate: bool = False):
+        yield ""
+
+    def config_str(self) -> str:
+        return ""
+
+
+class StatusError(Exception):
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeStream:
+    """
+    Streamed response that yields the given items, an exception in the items is raised instead.
+    """
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.closed = False
+
+    async def __aiter__(self):
+        for item in self.items:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def close(self):
+        self.closed = True
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+class TestStreamWithRetry(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.llm = FakeLlm()
+        self.opened = []
+        # no waiting between the attempts
+        patcher = patch.object(llm_interface.random, "uniform", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def opener(self, *streams):
+        pending = list(streams)
+
+        async def open_stream():
+            stream = pending.pop(0)
+            self.opened.append(stream)
+            if isinstance(stream, Exception):
+                raise stream
+            return stream
+        return open_stream
+
+    async def test_retry_on_429(self):
+        stream = FakeStream(["a", "b"])
+        chunks = await collect(self.llm._stream_with_retry(self.opener(StatusError(429), stream)))
+        self.assertEqual(chunks, ["a", "b"])
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(stream.closed)
+
+    async def test_retry_on_429_before_first_chunk(self):
+        failing = FakeStream([StatusError(429)])
+        chunks = await collect(self.llm._stream_with_retry(self.opener(failing, FakeStream(["a"]))))
+        self.assertEqual(chunks, ["a"])
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(failing.closed)
+
+    async def test_no_retry_after_first_chunk(self):
+        stream = FakeStream(["a", StatusError(429), "b"])
+        received = []
+        with self.assertRaises(StatusError):
+            async for chunk in self.llm._stream_with_retry(self.opener(stream, FakeStream(["x"]))):
+                received.append(chunk)
+        self.assertEqual(received, ["a"])
+        self.assertEqual(len(self.opened), 1)
+        self.assertTrue(stream.closed)
+
+    async def test_no_retry_on_client_error(self):
+        with self.assertRaises(StatusError):
+            await collect(self.llm._stream_with_retry(self.opener(StatusError(400), FakeStream(["a"]))))
+        self.assertEqual(len(self.opened), 1)
+
+
+class TestPrefetch(unittest.IsolatedAsyncioTestCase):
+
+    async def test_producer_cancelled_when_consumer_stops(self):
+        closed = asyncio.Event()
+
+        async def endless():
+            try:
+                n = 0
+                while True:
+                    yield n
+                    n += 1
+            finally:
+                closed.set()
+
+        received = []
+        async with contextlib.aclosing(LlmInterface._prefetch(endless(), maxsize=4)) as chunks:
+            async for chunk in chunks:
+                received.append(chunk)
+                if len(received) == 2:
+                    break
+        self.assertEqual(received, [0, 1])
+        self.assertTrue(closed.is_set())
+        # only the test itself is left running
+        self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+
+    async def test_error_raised_to_consumer(self):
+        async def failing():
+            yield "a"
+            raise StatusError(500)
+
+        received = []
+        with self.assertRaises(StatusError):
+            async for chunk in LlmInterface._prefetch(failing()):
+                received.append(chunk)
+        self.assertEqual(received, ["a"])
+
+
+class TestCoalesce(unittest.IsolatedAsyncioTestCase):
+
+    async def test_flush_by_size_then_by_time(self):
+        half = "a" * (llm_interface._FLUSH_BYTES // 2)
+
+        async def tokens():
+            # two halves arrive at once and fill a chunk
+            yield half
+            yield half
+            # a short token waits, the next one after the flush interval sends both
+            yield "b"
+            await asyncio.sleep(2 * llm_interface._FLUSH_SECONDS)
+            yield "c"
+            yield "d"
+
+        chunks = await collect(LlmInterface._coalesce(tokens()))
+        self.assertEqual(chunks, [half + half, "bc", "d"])
+
+    async def test_immediate_passes_tokens_through(self):
+        async def tokens():
+            for token in ("a", "b", "c"):
+                yield token
+
+        self.assertEqual(await collect(LlmInterface._coalesce(tokens(), immediate=True)), ["a", "b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
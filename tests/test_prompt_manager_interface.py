@@ -1,3 +1,4 @@
+import json
 import unittest
 from typing import List, Dict, Optional
 from mate.services.llm.prompt_manager_interface import (
@@ -24,7 +25,7 @@ class FakePromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
     def empty_history(self) -> None:
         self.histories[self.current_mode] = [{
             "role": "system",
-            "content": GLOBAL_BASE_TEMPLATES[self.current_mode.name].system_prompt
+            "content": GLOBAL_BASE_TEMPLATES[self.current_mode].system_prompt
         }]
 
     def get_history(self) -> List[Dict[str, str]]:
@@ -45,6 +46,11 @@ class FakePromptManager(PromptManager[List[Dict[str, str]], Dict[str, str]]):
         self.get_history().append(entry)
         return entry
 
+    def _do_add_entry(self, role: str, text: str) -> Dict[str, str]:
+        entry = {"role": role, "content": text}
+        self.get_history().append(entry)
+        return entry
+
     def count_history_tokens(self) -> int:
         # A trivial mock: each call we just sum up the length of all content strings
         total_len = 0
@@ -138,6 +144,36 @@ class TestPromptManagerInterface(unittest.TestCase):
         self.assertIn("User: Hello user!", output)
         self.assertIn("Assistant: Hello from assistant!", output)
 
+    def test_prompt_segments_static_first(self):
+        segments = self.manager.get_prompt_segments()
+        # the static system prompt leads, the per-turn timestamp comes last
+        self.assertEqual(segments[0], GLOBAL_BASE_TEMPLATES[Mode.CHAT].system_prompt)
+        self.assertTrue(segments[-1].startswith("Es ist "))
+
+
+    def test_templates_keyed_by_their_mode(self):
+        for mode, template in GLOBAL_BASE_TEMPLATES.items():
+            self.assertIs(template.mode, mode)
+
+    def test_reduce_with_batch_tokenizer(self):
+        calls = []
+
+        def batch(texts):
+            calls.append(list(texts))
+            return [len(text) for text in texts]
+
+        history = [{"role": "user", "content": "x" * 10} for _ in range(5)]
+        RemoveOldestStrategy().reduce(history, len, 25, batch)
+        self.assertEqual(len(history), 2)
+        # all entries are counted in one batch call
+        self.assertEqual(len(calls), 1)
+
+    def test_dump_history_json(self):
+        self.manager.empty_history()
+        self.manager.add_user_entry("Hallo")
+        dumped = json.loads(self.manager.dump_history_json())
+        self.assertEqual(dumped[-1], {"role": "user", "content": "Hallo"})
+
 
 if __name__ == "__main__":
     unittest.main()
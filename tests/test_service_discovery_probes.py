@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from mate.services import BaseService, ServiceDiscovery
+
+
+class FakeService(BaseService):
+    """
+    Service whose availability is the reachability of its configured endpoint, the probes are only recorded.
+    """
+    probes: list = []
+
+    @classmethod
+    def config_endpoint(cls):
+        return cls.config.get("endpoint")
+
+    @classmethod
+    async def _check_endpoint(cls, endpoint: str) -> bool:
+        FakeService.probes.append(endpoint)
+        # keep the probe open long enough for the other checks to find it running
+        await asyncio.sleep(0.05)
+        return True
+
+    async def check_availability(self) -> bool:
+        return True
+
+    def config_str(self) -> str:
+        return ""
+
+
+def make_service(name: str, endpoint: str):
+    def __init__(self):
+        BaseService.__init__(self, name, 1)
+    return type(name, (FakeService,), {
+        "__init__": __init__,
+        "service_type": "TTS",
+        "config": {"name": name, "priority": 1, "endpoint": endpoint},
+    })
+
+
+class TestServiceDiscoveryProbes(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        FakeService.probes = []
+
+    async def asyncTearDown(self):
+        await self.discovery.stop()
+
+    async def test_one_probe_per_endpoint(self):
+        self.discovery = ServiceDiscovery([
+            make_service("first", "http://host:8000/v1"),
+            make_service("second", "http://host:8000/v1/audio"),
+            make_service("other", "http://other:9000"),
+        ])
+        await self.discovery._check_services_once()
+        self.assertEqual(sorted(FakeService.probes), ["http://host:8000/v1", "http://other:9000"])
+        self.assertTrue(all(record.available for record in self.discovery.services.values()))
+
+    async def test_available_answer_reused_within_ttl(self):
+        self.discovery = ServiceDiscovery([make_service("first", "http://host:8000")])
+        await self.discovery._check_services_once()
+        await self.discovery._check_services_once()
+        self.assertEqual(FakeService.probes, ["http://host:8000"])
+        self.discovery.invalidate("first")
+        await self.discovery._check_services_once()
+        self.assertEqual(len(FakeService.probes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+from mate.audio.stream_resampler import StreamResampler
+
+
+class TestStreamResampler(unittest.TestCase):
+
+    def setUp(self):
+        # one second of a 440 Hz sine at the TTS stream rate
+        t = np.arange(24000) / 24000
+        self.signal = 10000 * np.sin(2 * np.pi * 440 * t)
+
+    def resample_in_chunks(self, chunk_size: int) -> np.ndarray:
+        resampler = StreamResampler(24000, 16000)
+        parts = [resampler.process(self.signal[i:i + chunk_size]) for i in range(0, len(self.signal), chunk_size)]
+        parts.append(resampler.flush())
+        return np.concatenate(parts)
+
+    def test_chunked_equals_whole(self):
+        whole = self.resample_in_chunks(len(self.signal))
+        # 150 ms chunks as played by speak_sentence_streaming, and an odd size that splits the phase
+        for chunk_size in (3600, 1001):
+            chunked = self.resample_in_chunks(chunk_size)
+            self.assertEqual(len(chunked), len(whole))
+            np.testing.assert_allclose(chunked, whole, atol=1e-6)
+
+    def test_no_steps_at_chunk_boundaries(self):
+        # 4096 byte network reads give chunks whose length is not a multiple of the 3:2 ratio
+        out = self.resample_in_chunks(1001)
+        # the curvature of a 440 Hz sine at 16 kHz is about 300, a restarted filter gives a kink of thousands
+        steady = out[100:-100]
+        self.assertLess(np.abs(np.diff(steady, n=2)).max(), 400)
+
+    def test_output_length(self):
+        out = self.resample_in_chunks(3600)
+        # the flush returns the delayed tail, at least two thirds of the input come out
+        self.assertGreaterEqual(len(out), 16000)
+
+    def test_same_rate_passes_through(self):
+        resampler = StreamResampler(16000, 16000)
+        np.testing.assert_array_equal(resampler.process(self.signal[:100]), self.signal[:100])
+        self.assertEqual(len(resampler.flush()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()